@@ -151,18 +151,9 @@ class AgentCoordinator:
                     thinking_data = thinking_chunk["thinking_data"]
 
                     # 重构ThinkingStep对象
-                    execution_plan = []
-                    for step_data in thinking_data.get("execution_plan", []):
-                        step = ThinkingStep(
-                            step_id=step_data.get("step_id", f"step_{len(execution_plan)+1}"),
-                            description=step_data.get("description", ""),
-                            reasoning=step_data.get("reasoning", ""),
-                            expected_tools=step_data.get("expected_tools", []),
-                            parameters=step_data.get("parameters", {}),
-                            priority=step_data.get("priority", 1),
-                            dependencies=step_data.get("dependencies", []),
-                        )
-                        execution_plan.append(step)
+                    execution_plan = [
+                        ThinkingStep.from_dict(step_data, i) for i, step_data in enumerate(thinking_data.get("execution_plan", []), 1)
+                    ]
 
                     # 重构ThinkingResult对象
                     thinking_result = ThinkingResult(
@@ -215,7 +215,7 @@ class ExecutionAgent:
             Dict: 包含完整对话上下文的消息输入
         """
         # 构建当前消息内容 - 使用多模态处理器
-        current_content = await self.multimodal_handler.build_multimodal_content(message, images)
+        current_content = self.multimodal_handler.build_multimodal_content(message, images)
 
         # 构建消息列表
         messages = []
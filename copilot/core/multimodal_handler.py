@@ -7,6 +7,39 @@ from typing import List, Optional
 from copilot.utils.logger import logger
 
 
+def _build_openai_image(image_data: dict) -> dict:
+    """构建OpenAI格式的图片内容"""
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": image_data.get("url") or 
+                   f"data:{image_data.get('mime_type', 'image/jpeg')};base64,{image_data.get('base64')}"
+        },
+    }
+
+
+def _build_base64_image(image_data: dict) -> dict:
+    """构建Claude格式的图片内容（同时作为默认格式）"""
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64", 
+            "media_type": image_data.get("mime_type", "image/jpeg"), 
+            "data": image_data.get("base64")
+        },
+    }
+
+
+# 支持多模态输入的提供商
+_MULTIMODAL_PROVIDERS = frozenset({"openai", "claude", "gemini"})
+
+# 提供商 -> 图片格式构建函数
+_IMAGE_BUILDERS = {
+    "openai": _build_openai_image,
+    "claude": _build_base64_image,
+}
+
+
 class MultimodalHandler:
     """多模态处理器 - 负责处理图片等多媒体内容"""
     
@@ -18,12 +51,15 @@ class MultimodalHandler:
             provider: LLM提供商名称
         """
         self.provider = provider
+        # 在初始化时确定图片构建函数，避免每张图片都按提供商分支
+        self._build_image = _IMAGE_BUILDERS.get(provider, _build_base64_image)
+        self._supports_multimodal = provider in _MULTIMODAL_PROVIDERS
     
     def supports_multimodal(self) -> bool:
         """检查当前提供商是否支持多模态"""
-        return self.provider in ["openai", "claude", "gemini"]
+        return self._supports_multimodal
     
-    async def preprocess_image(self, image_data: dict) -> dict:
+    def preprocess_image(self, image_data: dict) -> dict:
         """
         图片预处理
         - 格式转换
@@ -38,33 +74,7 @@ class MultimodalHandler:
         """
         try:
             # 根据不同提供商处理图片格式
-            if self.provider == "openai":
-                return {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": image_data.get("url") or 
-                               f"data:{image_data.get('mime_type', 'image/jpeg')};base64,{image_data.get('base64')}"
-                    },
-                }
-            elif self.provider == "claude":
-                return {
-                    "type": "image",
-                    "source": {
-                        "type": "base64", 
-                        "media_type": image_data.get("mime_type", "image/jpeg"), 
-                        "data": image_data.get("base64")
-                    },
-                }
-            else:
-                # 默认格式
-                return {
-                    "type": "image",
-                    "source": {
-                        "type": "base64", 
-                        "media_type": image_data.get("mime_type", "image/jpeg"), 
-                        "data": image_data.get("base64")
-                    },
-                }
+            return self._build_image(image_data)
         except Exception as e:
             logger.error(f"Error preprocessing image: {e}")
             # 返回错误格式的图片数据
@@ -73,7 +83,7 @@ class MultimodalHandler:
                 "error": f"图片处理失败: {str(e)}"
             }
     
-    async def build_multimodal_content(self, message: str, images: Optional[List[dict]]) -> any:
+    def build_multimodal_content(self, message: str, images: Optional[List[dict]]) -> any:
         """
         构建多模态内容
         
@@ -86,18 +96,13 @@ class MultimodalHandler:
         """
         try:
             # 如果没有图片或不支持多模态，返回纯文本
-            if not images or not self.supports_multimodal():
+            if not images or not self._supports_multimodal:
                 return message
             
             # 构建多模态内容
             content = [{"type": "text", "text": message}]
-            
-            for img in images:
-                processed_img = await self.preprocess_image(img)
-                if processed_img.get("type") != "error":
-                    content.append(processed_img)
-                else:
-                    logger.warning(f"Skipping invalid image: {processed_img.get('error')}")
+            # 处理失败的图片已在preprocess_image中记录日志，这里直接跳过
+            content.extend(img for img in map(self.preprocess_image, images) if img.get("type") != "error")
             
             return content
             
@@ -120,16 +125,9 @@ class MultimodalHandler:
             return []
         
         try:
-            images = []
-            for attachment in attachments:
-                if attachment.get("type") == "image":
-                    # 验证图片数据
-                    if self._validate_image_data(attachment):
-                        images.append(attachment)
-                    else:
-                        logger.warning(f"Invalid image attachment: {attachment}")
-            
-            return images
+            # 绑定局部名称，避免循环中重复的属性查找
+            validate = self._validate_image_data
+            return [attachment for attachment in attachments if attachment.get("type") == "image" and validate(attachment)]
             
         except Exception as e:
             logger.error(f"Error extracting images from attachments: {e}")
@@ -145,23 +143,16 @@ class MultimodalHandler:
         Returns:
             bool: 是否有效
         """
-        try:
-            # 检查必需字段
-            if not image_data.get("base64") and not image_data.get("url"):
-                return False
-            
-            # 检查MIME类型
-            mime_type = image_data.get("mime_type", "")
-            if mime_type and not mime_type.startswith("image/"):
-                return False
-            
-            # 检查base64数据长度（如果存在）
-            base64_data = image_data.get("base64", "")
-            if base64_data and len(base64_data) < 100:  # 太短的base64不太可能是有效图片
+        # 每个字段只取一次
+        base64_data = image_data.get("base64")
+        mime_type = image_data.get("mime_type")
+        
+        # 检查必需字段；太短的base64不太可能是有效图片
+        if base64_data:
+            if len(base64_data) < 100:
                 return False
-            
-            return True
-            
-        except Exception as e:
-            logger.warning(f"Error validating image data: {e}")
-            return False 
\ No newline at end of file
+        elif not image_data.get("url"):
+            return False
+        
+        # 检查MIME类型
+        return not mime_type or mime_type[:6] == "image/"
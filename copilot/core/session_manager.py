@@ -3,17 +3,53 @@
 支持多用户、多窗口的对话会话管理
 """
 
-import json
-import uuid
+import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, replace
 
+import orjson
+
+from copilot.core.stream_notifier import StreamNotifier
 from copilot.utils.redis_client import get_redis
+from copilot.utils.id_generator import generate_id
 from copilot.utils.logger import logger
 
+# 写入会话：HSET元数据 + EXPIRE + SET上下文（可选） + SADD用户会话列表 + EXPIRE + 记录会话所属用户，原子执行
+# KEYS: 会话键, 上下文键, 用户会话列表键, 会话所属用户哈希键
+# ARGV: 过期时间, 上下文JSON（空字符串表示不写入）, 会话ID, 用户ID, 元数据字段/值...
+_WRITE_SESSION_LUA = """
+local ttl = tonumber(ARGV[1])
+redis.call('HSET', KEYS[1], unpack(ARGV, 5))
+redis.call('EXPIRE', KEYS[1], ttl)
+if ARGV[2] ~= '' then
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ttl)
+end
+redis.call('SADD', KEYS[3], ARGV[3])
+redis.call('EXPIRE', KEYS[3], ttl)
+redis.call('HSET', KEYS[4], ARGV[3], ARGV[4])
+return 1
+"""
+
+# 会话键过期事件频道（需要在Redis服务端配置中开启notify-keyspace-events的E和x标志，应用不修改服务端配置）
+_EXPIRED_EVENT_PATTERN = "__keyevent@*__:expired"
+
+# 刷新会话活动时间：仅在会话仍存在时更新last_activity并续期会话键和上下文键
+# KEYS: 会话键, 上下文键
+# ARGV: 最后活动时间, 过期时间
+_TOUCH_SESSION_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'last_activity', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
 
-@dataclass
+@dataclass(slots=True)
 class SessionInfo:
     """会话信息"""
 
@@ -22,7 +58,7 @@ class SessionInfo:
     window_id: str  # 用户可能有多个窗口
     created_at: datetime
     last_activity: datetime
-    context: Dict[str, Any]  # 存储用户上下文信息
+    context: Optional[Dict[str, Any]]  # 存储用户上下文信息，单独存储，为None表示未加载（通过get_session_context按需获取）
     thread_id: str  # LangGraph的线程ID
 
 
@@ -31,8 +67,39 @@ class SessionManager:
 
     def __init__(self, session_timeout: int = 3600):  # 1小时超时
         self.session_timeout = session_timeout
-        self.redis_prefix = "agent_session:"
+        # 会话以Redis哈希存储（每个字段独立读写），使用独立前缀避免与旧的JSON字符串键冲突
+        self.redis_prefix = "agent_session_hash:"
+        # 旧版本以JSON字符串存储会话的键前缀，读取时迁移到哈希格式
+        self.legacy_redis_prefix = "agent_session:"
         self.user_sessions_prefix = "user_sessions:"
+        # 会话ID -> 用户ID，会话键过期后据此从用户会话列表中移除
+        self.session_owner_key = "agent_session_owner"
+        # 清理过期会话时每批检查的会话数量
+        self.cleanup_batch_size = 500
+        # 定期清理过期会话的间隔（秒）：未开启过期事件通知时依靠定期清理；
+        # 开启时仍以较长间隔对账，兜底监听断开期间遗漏的过期事件
+        self.cleanup_interval = 300
+        self.reconcile_interval = 3600
+        self.cleanup_task = None
+        # 进程内会话缓存：{session_id: (缓存时间, SessionInfo)}，短时间内的重复读取不再访问Redis
+        self._local_cache: Dict[str, Tuple[float, SessionInfo]] = {}
+        self.local_cache_ttl = 5.0
+        self.local_cache_size = 1024
+        # 数据库中不存在的会话：{session_id: 记录时间}，短时间内不再重复查询数据库
+        self._missing_sessions: Dict[str, float] = {}
+        self.missing_cache_ttl = 10.0
+        self.missing_cache_size = 10000
+        # 最后活动时间写回缓冲：{session_id: last_activity}，由后台任务定期批量写回Redis
+        self._pending_touches: Dict[str, datetime] = {}
+        self.touch_flush_interval = 2.0
+        self.touch_flush_size = 1000
+        self._touch_flush_event: Optional[asyncio.Event] = None
+        self.touch_flush_task = None
+        # Lua脚本对象，首次使用时注册
+        self._write_script = None
+        self._touch_script = None
+        # 监听会话过期事件的后台任务
+        self.expired_listener_task = None
         # 延迟导入避免循环依赖
         self._chat_history_manager = None
 
@@ -45,6 +112,39 @@ class SessionManager:
             self._chat_history_manager = chat_history_manager
         return self._chat_history_manager
 
+    async def start(self):
+        """启动会话管理器，开始后台批量写回最后活动时间"""
+        self._touch_flush_event = asyncio.Event()
+        self.touch_flush_task = asyncio.create_task(self._flush_touches_loop())
+        if await self._expired_events_enabled():
+            self.expired_listener_task = asyncio.create_task(self._listen_expired_sessions())
+            cleanup_interval = self.reconcile_interval
+        else:
+            cleanup_interval = self.cleanup_interval
+        self.cleanup_task = asyncio.create_task(self._cleanup_expired_sessions_loop(cleanup_interval))
+        logger.info("SessionManager started")
+
+    async def stop(self):
+        """停止会话管理器，并写回缓冲中剩余的最后活动时间"""
+        for task in (self.touch_flush_task, self.expired_listener_task, self.cleanup_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.touch_flush_task = None
+        self.expired_listener_task = None
+        self.cleanup_task = None
+        try:
+            await self.flush_touches()
+        except Exception as e:
+            logger.warning(f"Failed to flush session touches on stop: {e}")
+        # 脚本对象绑定在当前Redis连接上，重新启动时重新注册
+        self._write_script = None
+        self._touch_script = None
+        logger.info("SessionManager stopped")
+
     async def create_session(self, user_id: str, window_id: str) -> str:
         """
         创建新会话
@@ -56,11 +156,11 @@ class SessionManager:
         Returns:
             session_id: 会话ID
         """
-        session_id = str(uuid.uuid4())
+        session_id = generate_id()
         thread_id = f"{user_id}_{session_id}"
 
         if window_id is None:
-            window_id = str(uuid.uuid4())
+            window_id = generate_id()
 
         now = datetime.now()
         session_info = SessionInfo(
@@ -68,15 +168,8 @@ class SessionManager:
         )
 
         async with get_redis() as redis:
-            # 保存会话信息到Redis
-            session_key = f"{self.redis_prefix}{session_id}"
-            session_data = self._serialize_session(session_info)
-            await redis.set(session_key, session_data, ex=self.session_timeout)
-
-            # 维护用户的会话列表
-            user_sessions_key = f"{self.user_sessions_prefix}{user_id}"
-            await redis.sadd(user_sessions_key, session_id)
-            await redis.expire(user_sessions_key, self.session_timeout)
+            # 保存会话信息到Redis，并维护用户的会话列表
+            await self._write_session(redis, session_info)
 
         # 同时保存到数据库进行持久化
         try:
@@ -89,6 +182,34 @@ class SessionManager:
         logger.info(f"Created session {session_id} for user {user_id}, window {window_id}")
         return session_id
 
+    async def _write_session(self, redis, session_info: SessionInfo):
+        """
+        通过Lua脚本写入会话数据并刷新用户会话列表，一次网络往返且原子执行
+        会话上下文已加载时一并写入单独的上下文键
+
+        Args:
+            redis: Redis客户端
+            session_info: 会话信息
+        """
+        if self._write_script is None:
+            self._write_script = redis.register_script(_WRITE_SESSION_LUA)
+
+        context_json = orjson.dumps(session_info.context, default=str) if session_info.context is not None else ""
+        args = [self.session_timeout, context_json, session_info.session_id, session_info.user_id]
+        for field, value in self._serialize_session(session_info).items():
+            args.append(field)
+            args.append(value)
+
+        await self._write_script(
+            keys=[
+                f"{self.redis_prefix}{session_info.session_id}",
+                self._context_key(session_info.session_id),
+                f"{self.user_sessions_prefix}{session_info.user_id}",
+                self.session_owner_key,
+            ],
+            args=args,
+        )
+
     async def get_session(self, session_id: str) -> Optional[SessionInfo]:
         """
         获取会话信息
@@ -99,24 +220,233 @@ class SessionManager:
         Returns:
             SessionInfo or None
         """
+        cached = self._local_cache.get(session_id)
+        if cached and time.monotonic() - cached[0] < self.local_cache_ttl:
+            # 返回副本，调用方的修改不会影响缓存和其他调用方
+            session_info = replace(cached[1])
+            self._touch_session(session_info)
+            await self._flush_touches_if_idle()
+            return session_info
+
         async with get_redis() as redis:
             session_key = f"{self.redis_prefix}{session_id}"
-            session_data = await redis.get(session_key)
+            session_data = await redis.hgetall(session_key)
 
-            if not session_data:
+            if not self._is_complete_session(session_data):
+                # 旧版本的JSON字符串会话直接迁移
+                session_info = await self._migrate_legacy_session(redis, session_id)
+                if session_info:
+                    return session_info
                 # Redis中没有找到，尝试从数据库恢复
                 logger.info(f"Session {session_id} not found in Redis, attempting to restore from database")
                 return await self._restore_session_from_db(session_id)
 
             session_info = self._deserialize_session(session_data)
 
-            # 更新最后活动时间
-            session_info.last_activity = datetime.now()
-            updated_data = self._serialize_session(session_info)
-            await redis.set(session_key, updated_data, ex=self.session_timeout)
+            # 更新最后活动时间（由后台任务批量写回Redis）
+            self._touch_session(session_info)
+            await self._flush_touches_if_idle()
 
+            self._cache_session(session_info)
             return session_info
 
+    def _touch_session(self, session_info: SessionInfo):
+        """更新会话的最后活动时间，并放入写回缓冲"""
+        session_info.last_activity = datetime.now()
+        self._pending_touches[session_info.session_id] = session_info.last_activity
+        if len(self._pending_touches) >= self.touch_flush_size and self._touch_flush_event:
+            self._touch_flush_event.set()
+
+    async def _flush_touches_if_idle(self):
+        """后台写回任务未运行时（未调用start的脚本、测试、worker等）立即写回，避免使用中的会话过期"""
+        task = self.touch_flush_task
+        if task is None or task.done():
+            await self.flush_touches()
+
+    async def flush_touches(self):
+        """将缓冲的最后活动时间通过一个管道批量执行Lua脚本写回Redis，并刷新会话过期时间"""
+        if not self._pending_touches:
+            return
+
+        touches, self._pending_touches = self._pending_touches, {}
+        async with get_redis() as redis:
+            if self._touch_script is None:
+                self._touch_script = redis.register_script(_TOUCH_SESSION_LUA)
+            async with redis.pipeline(transaction=False) as pipe:
+                for session_id, last_activity in touches.items():
+                    # 脚本只更新仍存在的会话，写回前已过期的会话不会留下残缺的哈希
+                    await self._touch_script(
+                        keys=[f"{self.redis_prefix}{session_id}", self._context_key(session_id)],
+                        args=[last_activity.isoformat(), self.session_timeout],
+                        client=pipe,
+                    )
+                await pipe.execute()
+
+    async def _flush_touches_loop(self):
+        """定期（或缓冲达到上限时）写回最后活动时间"""
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._touch_flush_event.wait(), timeout=self.touch_flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._touch_flush_event.clear()
+                await self.flush_touches()
+            except Exception as e:
+                logger.error(f"Error flushing session touches: {e}")
+
+    async def _expired_events_enabled(self) -> bool:
+        """
+        检查Redis是否已开启键过期事件通知（部署配置项，应用只读取不修改，避免影响共用同一Redis的其他服务）
+
+        Returns:
+            bool: 已开启E和x标志时返回True
+        """
+        try:
+            async with get_redis() as redis:
+                config = await redis.config_get("notify-keyspace-events")
+            flags = config.get("notify-keyspace-events", "")
+            if "E" in flags and ("x" in flags or "A" in flags):
+                return True
+            logger.warning(
+                f"Redis notify-keyspace-events is '{flags}', expired events (Ex) are not enabled; "
+                f"falling back to cleanup_expired_sessions every {self.cleanup_interval}s"
+            )
+        except Exception as e:
+            # 托管Redis可能禁用CONFIG命令
+            logger.warning(f"Failed to read Redis notify-keyspace-events, falling back to cleanup_expired_sessions: {e}")
+        return False
+
+    async def _cleanup_expired_sessions_loop(self, interval: float):
+        """定期清理用户会话列表和会话所属用户哈希中的过期会话"""
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                await self.cleanup_expired_sessions()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error cleaning up expired sessions: {e}")
+
+    async def _listen_expired_sessions(self):
+        """订阅键过期事件，会话键过期时立即从用户会话列表中移除"""
+        while True:
+            try:
+                async with get_redis() as redis:
+                    pubsub = redis.pubsub()
+                    try:
+                        await pubsub.psubscribe(_EXPIRED_EVENT_PATTERN)
+                        async for message in pubsub.listen():
+                            if message["type"] != "pmessage":
+                                continue
+                            key = message["data"]
+                            if key.startswith(self.redis_prefix) and not key.endswith(":ctx"):
+                                await self._on_session_expired(key[len(self.redis_prefix) :])
+                    finally:
+                        await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error listening for expired sessions: {e}")
+                await asyncio.sleep(self.touch_flush_interval)
+
+    async def _on_session_expired(self, session_id: str):
+        """
+        处理会话过期：清理进程内状态，并从所属用户的会话列表中移除
+
+        Args:
+            session_id: 会话ID
+        """
+        self._invalidate_session(session_id)
+        self._pending_touches.pop(session_id, None)
+        StreamNotifier.clear_pending_messages(session_id)
+
+        async with get_redis() as redis:
+            user_id = await redis.hget(self.session_owner_key, session_id)
+            if user_id:
+                await redis.srem(f"{self.user_sessions_prefix}{user_id}", session_id)
+            await redis.hdel(self.session_owner_key, session_id)
+        logger.debug(f"Session {session_id} expired, removed from user {user_id}")
+
+    @staticmethod
+    def _is_complete_session(session_data: Optional[Dict[str, str]]) -> bool:
+        """检查会话哈希是否完整（会话过期后才写回的最后活动时间只会留下不完整的哈希）"""
+        return bool(session_data) and "session_id" in session_data
+
+    def _context_key(self, session_id: str) -> str:
+        """会话上下文的Redis键，与会话元数据分开存储"""
+        return f"{self.redis_prefix}{session_id}:ctx"
+
+    def _cache_session(self, session_info: SessionInfo):
+        """缓存会话信息的副本到进程内缓存，超出容量时淘汰最早的条目"""
+        cache = self._local_cache
+        cache.pop(session_info.session_id, None)
+        if len(cache) >= self.local_cache_size:
+            cache.pop(next(iter(cache)))
+        cache[session_info.session_id] = (time.monotonic(), replace(session_info))
+
+    def _invalidate_session(self, session_id: str):
+        """使进程内缓存的会话失效"""
+        self._local_cache.pop(session_id, None)
+
+    def _mark_session_missing(self, session_id: str):
+        """记录数据库中不存在的会话，超出容量时淘汰最早的条目"""
+        missing = self._missing_sessions
+        if len(missing) >= self.missing_cache_size:
+            missing.pop(next(iter(missing)))
+        missing[session_id] = time.monotonic()
+
+    async def _migrate_legacy_session(self, redis, session_id: str) -> Optional[SessionInfo]:
+        """
+        将旧版本JSON字符串格式的会话迁移为哈希格式，并删除旧键
+
+        Args:
+            redis: Redis客户端
+            session_id: 会话ID
+
+        Returns:
+            SessionInfo or None: 不存在旧格式会话时返回None
+        """
+        legacy_key = f"{self.legacy_redis_prefix}{session_id}"
+        legacy_data = await redis.get(legacy_key)
+        if not legacy_data:
+            return None
+
+        try:
+            data = orjson.loads(legacy_data)
+            session_info = SessionInfo(
+                session_id=data["session_id"],
+                user_id=data["user_id"],
+                window_id=data["window_id"],
+                created_at=datetime.fromisoformat(data["created_at"]),
+                last_activity=datetime.now(),
+                context=data.get("context") or {},
+                thread_id=data["thread_id"],
+            )
+            await self._write_session(redis, session_info)
+        except Exception as e:
+            logger.error(f"Failed to migrate legacy session {session_id}: {str(e)}")
+            return None
+
+        await redis.delete(legacy_key)
+        logger.info(f"Migrated legacy session {session_id} to hash storage")
+        return session_info
+
+    async def migrate_legacy_sessions(self) -> int:
+        """
+        一次性迁移Redis中所有旧版本JSON字符串格式的会话（部署新版本后运行）
+
+        Returns:
+            int: 迁移的会话数量
+        """
+        migrated = 0
+        async with get_redis() as redis:
+            legacy_keys = [key async for key in redis.scan_iter(match=f"{self.legacy_redis_prefix}*", count=self.cleanup_batch_size)]
+            for key in legacy_keys:
+                if await self._migrate_legacy_session(redis, key[len(self.legacy_redis_prefix) :]):
+                    migrated += 1
+        return migrated
+
     async def _restore_session_from_db(self, session_id: str) -> Optional[SessionInfo]:
         """
         从数据库恢复会话到Redis
@@ -127,6 +457,12 @@ class SessionManager:
         Returns:
             SessionInfo or None
         """
+        missing_since = self._missing_sessions.get(session_id)
+        if missing_since is not None:
+            if time.monotonic() - missing_since < self.missing_cache_ttl:
+                return None
+            del self._missing_sessions[session_id]
+
         try:
             # 从数据库查找会话信息
             from copilot.utils.mongo_client import MongoClient
@@ -135,6 +471,7 @@ class SessionManager:
                 session_doc = await mongo.find_one("chat_sessions", {"session_id": session_id, "status": "available"})
 
                 if not session_doc:
+                    self._mark_session_missing(session_id)
                     return None
 
                 # 重新构建SessionInfo
@@ -148,16 +485,10 @@ class SessionManager:
                     thread_id=session_doc["thread_id"],
                 )
 
-                # 重新保存到Redis
+                # 重新保存到Redis，并重新添加到用户会话列表
                 async with get_redis() as redis:
-                    session_key = f"{self.redis_prefix}{session_id}"
-                    session_data = self._serialize_session(session_info)
-                    await redis.set(session_key, session_data, ex=self.session_timeout)
-
-                    # 重新添加到用户会话列表
-                    user_sessions_key = f"{self.user_sessions_prefix}{session_info.user_id}"
-                    await redis.sadd(user_sessions_key, session_id)
-                    await redis.expire(user_sessions_key, self.session_timeout)
+                    await self._write_session(redis, session_info)
+                self._invalidate_session(session_id)
 
                 logger.info(f"Successfully restored session {session_id} from database")
                 return session_info
@@ -179,12 +510,27 @@ class SessionManager:
             logger.warning(f"Session {session_id} not found for context update")
             return
 
-        session_info.context.update(context)
+        # 只读写上下文键，不触及会话元数据
+        merged_context = await self.get_session_context(session_id)
+        merged_context.update(context)
 
         async with get_redis() as redis:
-            session_key = f"{self.redis_prefix}{session_id}"
-            session_data = self._serialize_session(session_info)
-            await redis.set(session_key, session_data, ex=self.session_timeout)
+            await redis.set(self._context_key(session_id), orjson.dumps(merged_context, default=str), ex=self.session_timeout)
+        self._invalidate_session(session_id)
+
+    async def get_session_context(self, session_id: str) -> Dict[str, Any]:
+        """
+        获取会话上下文（与会话元数据分开存储，按需加载）
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            Dict[str, Any]: 会话上下文，不存在时返回空字典
+        """
+        async with get_redis() as redis:
+            context_data = await redis.get(self._context_key(session_id))
+        return orjson.loads(context_data) if context_data else {}
 
     async def get_user_sessions(self, user_id: str) -> List[SessionInfo]:
         """
@@ -198,16 +544,40 @@ class SessionManager:
         """
         async with get_redis() as redis:
             user_sessions_key = f"{self.user_sessions_prefix}{user_id}"
-            session_ids = await redis.smembers(user_sessions_key)
+            session_ids = list(await redis.smembers(user_sessions_key))
+            if not session_ids:
+                return []
+
+            # 通过一个管道获取所有会话数据
+            async with redis.pipeline(transaction=False) as pipe:
+                for session_id in session_ids:
+                    pipe.hgetall(f"{self.redis_prefix}{session_id}")
+                session_datas = await pipe.execute()
 
             sessions = []
-            for session_id in session_ids:
-                session_info = await self.get_session(session_id)
+            missing_ids = []
+            # 命中的会话更新最后活动时间（由后台任务批量写回Redis）
+            for session_id, session_data in zip(session_ids, session_datas):
+                if not self._is_complete_session(session_data):
+                    missing_ids.append(session_id)
+                    continue
+                session_info = self._deserialize_session(session_data)
+                self._touch_session(session_info)
+                self._cache_session(session_info)
+                sessions.append(session_info)
+            await self._flush_touches_if_idle()
+
+            # Redis中缺失的会话尝试从数据库恢复，恢复失败的清理无效的会话ID
+            invalid_ids = []
+            for session_id in missing_ids:
+                session_info = await self._migrate_legacy_session(redis, session_id) or await self._restore_session_from_db(session_id)
                 if session_info:
                     sessions.append(session_info)
                 else:
-                    # 清理无效的会话ID
-                    await redis.srem(user_sessions_key, session_id)
+                    invalid_ids.append(session_id)
+            if invalid_ids:
+                await redis.srem(user_sessions_key, *invalid_ids)
+                await redis.hdel(self.session_owner_key, *invalid_ids)
 
             return sessions
 
@@ -222,15 +592,19 @@ class SessionManager:
         session_info = await self.get_session(session_id)
         if not session_info:
             return
+        self._invalidate_session(session_id)
+        self._pending_touches.pop(session_id, None)
+        StreamNotifier.clear_pending_messages(session_id)
 
         async with get_redis() as redis:
             # 删除Redis中的会话数据
             session_key = f"{self.redis_prefix}{session_id}"
-            await redis.delete(session_key)
+            await redis.delete(session_key, self._context_key(session_id))
 
             # 从用户会话列表中移除
             user_sessions_key = f"{self.user_sessions_prefix}{session_info.user_id}"
             await redis.srem(user_sessions_key, session_id)
+            await redis.hdel(self.session_owner_key, session_id)
 
         # 归档到数据库
         if archive:
@@ -242,36 +616,73 @@ class SessionManager:
         logger.info(f"Deleted session {session_id} (archived: {archive})")
 
     async def cleanup_expired_sessions(self):
-        """清理过期会话（可以作为定时任务运行）"""
-        # Redis的过期机制会自动清理过期的键
-        # 这里主要是清理用户会话列表中的无效引用
+        """清理过期会话（由后台任务定期运行）"""
+        # Redis的过期机制会自动清理过期的键，开启过期事件通知时用户会话列表中的引用由监听实时移除
+        # 这里定期对账：清理过期事件未开启或监听断开期间遗漏的无效引用。
+        # 会话键续期时用户会话列表不续期，长期活跃的会话可能比所在的用户会话列表存活更久，
+        # 因此会话所属用户哈希单独扫描，不依赖用户会话列表
         async with get_redis() as redis:
-            # 获取所有用户会话键
+            # 使用SCAN增量遍历所有用户会话键，避免KEYS阻塞Redis
             pattern = f"{self.user_sessions_prefix}*"
-            keys = await redis.keys(pattern)
-
-            for key in keys:
-                session_ids = await redis.smembers(key)
-                for session_id in session_ids:
-                    session_key = f"{self.redis_prefix}{session_id}"
-                    if not await redis.exists(session_key):
-                        await redis.srem(key, session_id)
-
-    def _serialize_session(self, session_info: SessionInfo) -> str:
-        """序列化会话信息"""
-        data = asdict(session_info)
-        # 处理datetime对象
-        data["created_at"] = session_info.created_at.isoformat()
-        data["last_activity"] = session_info.last_activity.isoformat()
-        return json.dumps(data)
-
-    def _deserialize_session(self, session_data: str) -> SessionInfo:
-        """反序列化会话信息"""
-        data = json.loads(session_data)
-        # 处理datetime对象
-        data["created_at"] = datetime.fromisoformat(data["created_at"])
-        data["last_activity"] = datetime.fromisoformat(data["last_activity"])
-        return SessionInfo(**data)
+            async for key in redis.scan_iter(match=pattern, count=self.cleanup_batch_size):
+                session_ids = list(await redis.smembers(key))
+
+                # 分批通过管道检查会话是否存在，并批量移除失效的会话ID
+                for i in range(0, len(session_ids), self.cleanup_batch_size):
+                    batch = session_ids[i : i + self.cleanup_batch_size]
+                    async with redis.pipeline(transaction=False) as pipe:
+                        for session_id in batch:
+                            pipe.exists(f"{self.redis_prefix}{session_id}")
+                        exists_results = await pipe.execute()
+
+                    expired_ids = [session_id for session_id, exists in zip(batch, exists_results) if not exists]
+                    if expired_ids:
+                        await redis.srem(key, *expired_ids)
+                        await redis.hdel(self.session_owner_key, *expired_ids)
+
+            # 使用HSCAN增量遍历会话所属用户哈希，分批移除会话键已不存在的条目
+            batch = []
+            async for session_id, _ in redis.hscan_iter(self.session_owner_key, count=self.cleanup_batch_size):
+                batch.append(session_id)
+                if len(batch) >= self.cleanup_batch_size:
+                    await self._remove_expired_owners(redis, batch)
+                    batch = []
+            if batch:
+                await self._remove_expired_owners(redis, batch)
+
+    async def _remove_expired_owners(self, redis, session_ids: List[str]):
+        """从会话所属用户哈希中移除会话键已不存在的会话"""
+        async with redis.pipeline(transaction=False) as pipe:
+            for session_id in session_ids:
+                pipe.exists(f"{self.redis_prefix}{session_id}")
+            exists_results = await pipe.execute()
+
+        expired_ids = [session_id for session_id, exists in zip(session_ids, exists_results) if not exists]
+        if expired_ids:
+            await redis.hdel(self.session_owner_key, *expired_ids)
+
+    def _serialize_session(self, session_info: SessionInfo) -> Dict[str, Any]:
+        """序列化会话元数据为Redis哈希字段（上下文单独存储）"""
+        return {
+            "session_id": session_info.session_id,
+            "user_id": session_info.user_id,
+            "window_id": session_info.window_id,
+            "created_at": session_info.created_at.isoformat(),
+            "last_activity": session_info.last_activity.isoformat(),
+            "thread_id": session_info.thread_id,
+        }
+
+    def _deserialize_session(self, session_data: Dict[str, str]) -> SessionInfo:
+        """从Redis哈希字段反序列化会话元数据，上下文按需通过get_session_context加载"""
+        return SessionInfo(
+            session_id=session_data["session_id"],
+            user_id=session_data["user_id"],
+            window_id=session_data["window_id"],
+            created_at=datetime.fromisoformat(session_data["created_at"]),
+            last_activity=datetime.fromisoformat(session_data["last_activity"]),
+            context=None,
+            thread_id=session_data["thread_id"],
+        )
 
 
 # 全局会话管理器实例
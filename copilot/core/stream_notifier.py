@@ -2,160 +2,291 @@
 流式通知器 - 通过聊天流发送MCP工具状态和权限请求
 """
 
-import uuid
+import logging
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
 from datetime import datetime, UTC
-from typing import Any, Dict, Optional
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
 from copilot.model.chat_model import ToolPermissionRequest, ToolExecutionStatus, ToolPermissionRequestMessage, ToolExecutionStatusMessage
+from copilot.utils.id_generator import generate_id
 from copilot.utils.logger import logger
 
+# 每个会话最多缓存的待发送消息数，超出后丢弃最早的消息
+_MAX_PENDING_MESSAGES = 1024
+
+# 消息队列闲置超过该时间（秒）未被读写则整体回收，避免消费端断开后队列长期滞留
+_PENDING_IDLE_TTL = 600
+# 闲置队列的检查间隔（秒），在写入消息时顺带检查
+_PENDING_SWEEP_INTERVAL = 60
+
+# 可能承载工具参数的特殊字段（按优先级排列）
+_COMMON_PARAM_FIELDS = ("input", "query", "text", "data", "content", "params", "parameters")
+_COMMON_PARAM_FIELD_SET = frozenset(_COMMON_PARAM_FIELDS)
+
+# 截断后的参数值后缀
+_TRUNC_SUFFIX = "... (truncated)"
+
+# 提取参数时需要过滤掉的内部配置参数
+_FILTER_KWARGS = frozenset({"config", "run_manager", "callbacks"})
+
+# 相同状态事件的去重窗口（秒）
+_STATUS_DEDUP_WINDOW = 0.05
+
+# 消息时间戳缓存粒度（秒），同一毫秒内的事件共用一个datetime对象
+_TIMESTAMP_GRANULARITY = 0.001
+_last_timestamp: list = [0.0, datetime.fromtimestamp(0, UTC)]
+
+
+def _utc_now() -> datetime:
+    """获取当前UTC时间，按毫秒粒度缓存，避免工具执行循环中频繁构造datetime"""
+    now = time.time()
+    # 取绝对值：系统时钟回拨（如NTP校时）时也立即刷新，不会一直返回回拨前的时间
+    if abs(now - _last_timestamp[0]) >= _TIMESTAMP_GRANULARITY:
+        _last_timestamp[0] = now
+        _last_timestamp[1] = datetime.fromtimestamp(now, UTC)
+    return _last_timestamp[1]
+
+
+def _truncate(value: Any, limit: int) -> str:
+    """转换为字符串并截断到指定长度，每个值只调用一次str()"""
+    text = value if isinstance(value, str) else str(value)
+    return text if len(text) <= limit else text[:limit] + _TRUNC_SUFFIX
+
+
+def _truncate_long_values(params: Dict[str, Any]) -> Dict[str, Any]:
+    """截断过长的字符串参数值；无需截断时直接返回原字典，不做复制"""
+    if not any(isinstance(value, str) and len(value) > 200 for value in params.values()):
+        return params
+    return {key: _truncate(value, 200) if isinstance(value, str) else value for key, value in params.items()}
+
+
+def extract_tool_parameters(args, kwargs=None, tool_name=None) -> Dict[str, Any]:
+    """
+    从工具参数中提取可显示的参数信息 - 增强版本，支持多种参数传递方式
+
+    Args:
+        args: 工具调用的位置参数
+        kwargs: 工具调用的关键字参数（可选）
+        tool_name: 工具名称（用于调试）
+
+    Returns:
+        Dict[str, Any]: 提取的参数信息
+    """
+    try:
+        # 调试信息只在开启DEBUG日志时输出，避免对大参数做无谓的格式化
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Extracting parameters for tool %s: args=%r, kwargs=%r", tool_name, args, kwargs)
+
+        # 最常见的调用形式：单个非空字典参数且没有kwargs，直接返回
+        if not kwargs and args and len(args) == 1:
+            first_arg = args[0]
+            if type(first_arg) is dict and first_arg:
+                return _truncate_long_values(first_arg)
+
+        extracted_params = {}
+
+        # 方式1: 从 args 中提取（优先级最高）
+        if args:
+            if len(args) == 1 and isinstance(args[0], dict):
+                # 单个字典参数（空字典不复用，避免后续合并时修改调用方的参数）
+                if args[0]:
+                    extracted_params = _truncate_long_values(args[0])
+            else:
+                # 多个参数或非字典参数
+                extracted_params["args"] = [_truncate(arg, 100) for arg in args]
+
+            # 如果从args中提取到参数，直接返回
+            if extracted_params:
+                return extracted_params
+
+        # 方式2: 检查kwargs中的特殊参数字段（优先于普通kwargs）
+        if kwargs and not _COMMON_PARAM_FIELD_SET.isdisjoint(kwargs):
+            for field in _COMMON_PARAM_FIELDS:
+                if field in kwargs:
+                    param_value = kwargs[field]
+                    if isinstance(param_value, dict):
+                        # 如果参数值是字典，展开其内容
+                        extracted_params.update(param_value)
+                    else:
+                        # 如果参数值不是字典，保留字段名
+                        extracted_params[field] = param_value
+
+                    # 找到特殊字段就返回，不继续检查
+                    if extracted_params:
+                        logger.debug("Extracted parameters for tool %s from %s field", tool_name, field)
+                        return extracted_params
+
+        # 方式3: 从普通 kwargs 中提取（最后的选择）
+        if kwargs:
+            # 过滤掉内部配置参数
+            filtered_kwargs = _truncate_long_values(
+                {key: value for key, value in kwargs.items() if key not in _FILTER_KWARGS}
+            )
+
+            if filtered_kwargs:
+                extracted_params = filtered_kwargs
+
+        # 如果仍然没有参数（无参数或使用默认值的工具属于正常情况）
+        if not extracted_params:
+            logger.info("No parameters extracted for tool %s", tool_name)
+            return {}
+
+        return extracted_params
+
+    except Exception as e:
+        logger.warning(f"Error extracting tool parameters for {tool_name}: {e}")
+        logger.debug("Failed parameter extraction input: args=%r, kwargs=%r", args, kwargs)
+        return {"args": "parameter extraction failed", "error": str(e)}
+
+
+@lru_cache(maxsize=256)
+def _tool_description(tool_name: str) -> str:
+    """权限请求中的工具描述，按工具名称缓存"""
+    return f"工具 {tool_name} 需要执行"
+
+
+@dataclass(slots=True)
+class ToolExecInfo:
+    """单次工具调用的执行信息"""
+
+    tool_name: str
+    session_id: Optional[str]
+    parameters: Dict[str, Any]
+    start_time_ns: int
+    risk_level: str = "medium"
+    request_id: Optional[str] = None
+
 
 class StreamNotifier:
     """流式通知器 - 通过聊天流发送工具权限和状态通知"""
 
-    # 存储待发送的流式消息队列 (session_id -> list of messages)
-    _pending_messages = {}
+    # 存储待发送的流式消息队列 (session_id -> deque of messages)，每个会话的队列有长度上限，超出时自动丢弃最早的消息
+    _pending_messages: Dict[str, deque] = defaultdict(lambda: deque(maxlen=_MAX_PENDING_MESSAGES))
+
+    # 每个会话消息队列最近一次读写的时间 (session_id -> monotonic时间)，用于回收闲置队列
+    _last_access: Dict[str, float] = {}
+    _last_sweep: float = 0.0
+
+    # 每个会话最近一次发送的执行状态 (session_id -> (request_id, status, monotonic时间))，用于去重
+    _last_status: Dict[str, tuple] = {}
+
+    # 工具参数提取函数表 (tool_name -> extractor)，在工具注册时解析
+    _extractors: Dict[str, Callable[..., Dict[str, Any]]] = {}
 
     @staticmethod
-    def extract_tool_parameters(args, kwargs=None, tool_name=None) -> Dict[str, Any]:
+    def resolve_extractor(tool_name: str) -> Callable[..., Dict[str, Any]]:
         """
-        从工具参数中提取可显示的参数信息 - 增强版本，支持多种参数传递方式
+        获取绑定了工具名称的参数提取函数，工具包装时调用一次，执行时直接调用
 
         Args:
-            args: 工具调用的位置参数
-            kwargs: 工具调用的关键字参数（可选）
-            tool_name: 工具名称（用于调试）
+            tool_name: 工具名称
 
         Returns:
-            Dict[str, Any]: 提取的参数信息
+            Callable: 签名为 (args, kwargs=None) 的参数提取函数
         """
-        try:
-            # 详细的调试信息
-            logger.debug(f"Extracting parameters for tool {tool_name}:")
-            logger.debug(f"  args type: {type(args)}")
-            logger.debug(f"  args content: {args}")
-            logger.debug(f"  kwargs type: {type(kwargs)}")
-            logger.debug(f"  kwargs content: {kwargs}")
-            
-            extracted_params = {}
-            
-            # 方式1: 从 args 中提取（优先级最高）
-            if args:
-                logger.debug(f"  Extracting from args...")
-                if len(args) == 1 and isinstance(args[0], dict):
-                    # 单个字典参数
-                    for key, value in args[0].items():
-                        if isinstance(value, str) and len(value) > 200:
-                            extracted_params[key] = f"{value[:200]}... (truncated)"
-                        else:
-                            extracted_params[key] = value
-                    logger.debug(f"  Extracted from single dict arg: {extracted_params}")
-                else:
-                    # 多个参数或非字典参数
-                    extracted_params["args"] = [str(arg)[:100] + "..." if len(str(arg)) > 100 else str(arg) for arg in args]
-                    logger.debug(f"  Extracted from multiple args: {extracted_params}")
-                
-                # 如果从args中提取到参数，直接返回
-                if extracted_params:
-                    logger.debug(f"  Final extracted parameters from args: {extracted_params}")
-                    return extracted_params
-            
-            # 方式2: 检查kwargs中的特殊参数字段（优先于普通kwargs）
-            if kwargs:
-                logger.debug(f"  Checking special parameter fields in kwargs...")
-                common_param_fields = ['input', 'query', 'text', 'data', 'content', 'params', 'parameters']
-                for field in common_param_fields:
-                    if field in kwargs:
-                        param_value = kwargs[field]
-                        if isinstance(param_value, dict):
-                            # 如果参数值是字典，展开其内容
-                            extracted_params.update(param_value)
-                            logger.debug(f"  Extracted and expanded from {field} field: {extracted_params}")
-                        else:
-                            # 如果参数值不是字典，保留字段名
-                            extracted_params[field] = param_value
-                            logger.debug(f"  Extracted from {field} field: {extracted_params}")
-                        
-                        # 找到特殊字段就返回，不继续检查
-                        if extracted_params:
-                            logger.debug(f"  Final extracted parameters from special field: {extracted_params}")
-                            return extracted_params
-            
-            # 方式3: 从普通 kwargs 中提取（最后的选择）
-            if kwargs:
-                logger.debug(f"  Extracting from regular kwargs...")
-                # 过滤掉内部配置参数
-                filtered_kwargs = {}
-                for key, value in kwargs.items():
-                    if key not in ['config', 'run_manager', 'callbacks']:
-                        if isinstance(value, str) and len(value) > 200:
-                            filtered_kwargs[key] = f"{value[:200]}... (truncated)"
-                        else:
-                            filtered_kwargs[key] = value
-                
-                if filtered_kwargs:
-                    extracted_params = filtered_kwargs
-                    logger.debug(f"  Extracted from regular kwargs: {extracted_params}")
-            
-            # 如果仍然没有参数，记录详细信息
-            if not extracted_params:
-                logger.info(f"No parameters extracted for tool {tool_name}")
-                logger.debug(f"  This might be normal for tools with no parameters or using default values")
-                return {}
-            
-            logger.debug(f"  Final extracted parameters: {extracted_params}")
-            return extracted_params
+        extractor = StreamNotifier._extractors.get(tool_name)
+        if extractor is None:
+            extractor = partial(extract_tool_parameters, tool_name=tool_name)
+            StreamNotifier._extractors[tool_name] = extractor
+        return extractor
 
-        except Exception as e:
-            logger.warning(f"Error extracting tool parameters for {tool_name}: {e}")
-            logger.debug(f"  args: {args}")
-            logger.debug(f"  kwargs: {kwargs}")
-            return {"args": "parameter extraction failed", "error": str(e)}
+    # 兼容通过类访问的调用方
+    extract_tool_parameters = staticmethod(extract_tool_parameters)
 
     @staticmethod
     async def add_stream_message(session_id: str, message):
-        """添加消息到流式队列"""
+        """添加消息到流式队列，队列已满时丢弃最早的消息"""
         try:
-            if session_id not in StreamNotifier._pending_messages:
-                StreamNotifier._pending_messages[session_id] = []
+            now = time.monotonic()
+            if now - StreamNotifier._last_sweep >= _PENDING_SWEEP_INTERVAL:
+                StreamNotifier._evict_idle_queues(now)
 
-            StreamNotifier._pending_messages[session_id].append(message)
+            queue = StreamNotifier._pending_messages[session_id]
+            if len(queue) == queue.maxlen:
+                logger.warning(f"Stream message queue full for session {session_id}, dropped the oldest message")
+            queue.append(message)
+            StreamNotifier._last_access[session_id] = now
             logger.debug(f"Added stream message for session {session_id}: {type(message).__name__}")
 
         except Exception as e:
             logger.warning(f"Failed to add stream message: {e}")
 
     @staticmethod
-    def get_pending_messages(session_id: str) -> list:
-        """获取并清空待发送的消息"""
+    def get_pending_messages(session_id: str, max_items: Optional[int] = None) -> list:
+        """获取并清空待发送的消息（不等待）"""
         try:
-            messages = StreamNotifier._pending_messages.get(session_id, [])
-            StreamNotifier._pending_messages[session_id] = []
-            return messages
+            queue = StreamNotifier._pending_messages.get(session_id)
+            if queue is None:
+                return []
+            StreamNotifier._last_access[session_id] = time.monotonic()
+            return StreamNotifier._drain_queue(queue, max_items)
         except Exception as e:
             logger.warning(f"Failed to get pending messages: {e}")
             return []
 
+    @staticmethod
+    def iter_pending_messages(session_id: str) -> Iterator[Any]:
+        """逐条取出待发送的消息（不等待），边取边发送，不构造中间列表"""
+        queue = StreamNotifier._pending_messages.get(session_id)
+        if queue is None:
+            return
+        StreamNotifier._last_access[session_id] = time.monotonic()
+        while queue:
+            yield queue.popleft()
+
+    @staticmethod
+    def _drain_queue(queue: deque, max_items: Optional[int]) -> List[Any]:
+        """取出队列中已有的消息"""
+        if max_items is None or max_items >= len(queue):
+            messages = list(queue)
+            queue.clear()
+            return messages
+        return [queue.popleft() for _ in range(max_items)]
+
+    @staticmethod
+    def clear_pending_messages(session_id: str):
+        """会话关闭时移除该会话的消息队列"""
+        StreamNotifier._pending_messages.pop(session_id, None)
+        StreamNotifier._last_status.pop(session_id, None)
+        StreamNotifier._last_access.pop(session_id, None)
+
+    @staticmethod
+    def _evict_idle_queues(now: float):
+        """回收闲置超时的会话消息队列"""
+        StreamNotifier._last_sweep = now
+        idle_ids = [
+            session_id
+            for session_id, last_access in StreamNotifier._last_access.items()
+            if now - last_access >= _PENDING_IDLE_TTL
+        ]
+        for session_id in idle_ids:
+            StreamNotifier.clear_pending_messages(session_id)
+        if idle_ids:
+            logger.info(f"Evicted {len(idle_ids)} idle stream message queues")
+
     @staticmethod
     async def send_tool_permission_request(
         session_id: str, tool_name: str, parameters: Dict[str, Any], risk_level: str = "medium", reasoning: Optional[str] = None
     ) -> str:
         """发送工具权限请求消息"""
         try:
-            request_id = str(uuid.uuid4())
+            request_id = generate_id()
 
-            # 创建权限请求数据
-            permission_request = ToolPermissionRequest(
+            # 创建权限请求数据（字段均由本模块构造，跳过pydantic校验）
+            permission_request = ToolPermissionRequest.model_construct(
                 request_id=request_id,
                 tool_name=tool_name,
-                tool_description=f"工具 {tool_name} 需要执行",
+                tool_description=_tool_description(tool_name),
                 parameters=parameters,
                 risk_level=risk_level,
                 reasoning=reasoning,
             )
 
             # 创建流式消息
-            message = ToolPermissionRequestMessage(session_id=session_id, timestamp=datetime.now(UTC), data=permission_request)
+            message = ToolPermissionRequestMessage.model_construct(session_id=session_id, timestamp=_utc_now(), data=permission_request)
 
             # 添加到流式队列
             await StreamNotifier.add_stream_message(session_id, message)
@@ -179,13 +310,29 @@ class StreamNotifier:
     ):
         """发送工具执行状态消息"""
         try:
-            # 创建执行状态数据
-            execution_status = ToolExecutionStatus(
+            # 短时间内重复的无负载状态转换（同一请求、同一状态）直接忽略，减少流消息数量
+            now = time.monotonic()
+            last = StreamNotifier._last_status.get(session_id)
+            if (
+                last is not None
+                and last[0] == request_id
+                and last[1] == status
+                and now - last[2] < _STATUS_DEDUP_WINDOW
+                and result is None
+                and error is None
+                and progress is None
+            ):
+                logger.debug(f"Skipped duplicate tool execution status for session {session_id}: {tool_name} - {status}")
+                return
+            StreamNotifier._last_status[session_id] = (request_id, status, now)
+
+            # 创建执行状态数据（字段均由本模块构造，跳过pydantic校验）
+            execution_status = ToolExecutionStatus.model_construct(
                 request_id=request_id, tool_name=tool_name, status=status, result=result, error=error, progress=progress
             )
 
             # 创建流式消息
-            message = ToolExecutionStatusMessage(session_id=session_id, timestamp=datetime.now(UTC), data=execution_status)
+            message = ToolExecutionStatusMessage.model_construct(session_id=session_id, timestamp=_utc_now(), data=execution_status)
 
             # 添加到流式队列
             await StreamNotifier.add_stream_message(session_id, message)
@@ -195,46 +342,54 @@ class StreamNotifier:
         except Exception as e:
             logger.error(f"Failed to send tool execution status: {e}")
 
+    @staticmethod
+    def _ensure_request_id(tool_info: ToolExecInfo) -> str:
+        """获取本次工具调用的request_id，没有时生成一次并记录，后续通知复用同一个ID"""
+        request_id = tool_info.request_id
+        if not request_id:
+            request_id = tool_info.request_id = generate_id()
+        return request_id
+
     # 提供与SimpleNotifier兼容的接口
     @staticmethod
-    async def notify_tool_execution_start(session_id: str, tool_info: Dict[str, Any]):
+    async def notify_tool_execution_start(session_id: str, tool_info: ToolExecInfo):
         """通知工具开始执行"""
-        request_id = tool_info.get("request_id", str(uuid.uuid4()))
+        request_id = StreamNotifier._ensure_request_id(tool_info)
         await StreamNotifier.send_tool_execution_status(
-            session_id=session_id, request_id=request_id, tool_name=tool_info["tool_name"], status="executing"
+            session_id=session_id, request_id=request_id, tool_name=tool_info.tool_name, status="executing"
         )
 
     @staticmethod
-    async def notify_tool_waiting_permission(session_id: str, tool_info: Dict[str, Any]):
+    async def notify_tool_waiting_permission(session_id: str, tool_info: ToolExecInfo):
         """通知工具等待权限确认"""
         # 发送权限请求
         request_id = await StreamNotifier.send_tool_permission_request(
             session_id=session_id,
-            tool_name=tool_info["tool_name"],
-            parameters=tool_info["parameters"],
-            risk_level=tool_info.get("risk_level", "medium"),
+            tool_name=tool_info.tool_name,
+            parameters=tool_info.parameters,
+            risk_level=tool_info.risk_level,
         )
 
         # 更新工具信息中的request_id
-        tool_info["request_id"] = request_id
+        tool_info.request_id = request_id
 
         # 发送等待状态
         await StreamNotifier.send_tool_execution_status(
-            session_id=session_id, request_id=request_id, tool_name=tool_info["tool_name"], status="waiting"
+            session_id=session_id, request_id=request_id, tool_name=tool_info.tool_name, status="waiting"
         )
 
     @staticmethod
-    async def notify_tool_execution_complete(session_id: str, tool_info: Dict[str, Any], result: Any, success: bool):
+    async def notify_tool_execution_complete(session_id: str, tool_info: ToolExecInfo, result: Any, success: bool):
         """通知工具执行完成"""
-        request_id = tool_info.get("request_id", str(uuid.uuid4()))
+        request_id = StreamNotifier._ensure_request_id(tool_info)
 
         if success:
             # 直接使用工具的原始结果对象，保持数据结构
             await StreamNotifier.send_tool_execution_status(
-                session_id=session_id, request_id=request_id, tool_name=tool_info["tool_name"], status="completed", result=result  # 直接传递原始对象
+                session_id=session_id, request_id=request_id, tool_name=tool_info.tool_name, status="completed", result=result  # 直接传递原始对象
             )
         else:
             # 处理失败结果
             await StreamNotifier.send_tool_execution_status(
-                session_id=session_id, request_id=request_id, tool_name=tool_info["tool_name"], status="failed", error=str(result)
+                session_id=session_id, request_id=request_id, tool_name=tool_info.tool_name, status="failed", error=str(result)
             )
@@ -3,10 +3,20 @@
 不执行实际工具，只进行思考和规划
 """
 
-import json
-from dataclasses import dataclass, field
+import asyncio
+import logging
+import re
+from collections import deque
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import orjson
+from langchain_anthropic import ChatAnthropic
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 
 from copilot.core.llm_factory import LLMFactory
 from copilot.utils.logger import logger
@@ -18,9 +28,418 @@ MAX_EXECUTION_STEPS = 5
 MAX_CONVERSATION_HISTORY = 5
 MAX_USER_INPUT_LENGTH = 200
 MAX_PROBLEM_ANALYSIS_LENGTH = 800
+DEFAULT_STREAM_BATCH_MS = 50
+DEFAULT_STREAM_BATCH_MAX = 8
+CONTEXT_CACHE_SIZE = 32
+# 流式分块时间戳的刷新间隔（秒），间隔内的分块共用同一时间戳
+STREAM_TIMESTAMP_REFRESH = 0.05
+DEFAULT_THINK_CACHE_SIZE = 128
+DEFAULT_INPUT_TOKEN_BUDGET = 6000
+
 
+_THINKING_PROMPT_BASE = """你是一个专业的AI思考助手，负责分析用户输入并制定处理计划。
+
+请以自然、流畅的方式分析用户的需求，并制定执行计划。你可以这样思考：
 
-@dataclass
+1. 首先理解用户想要什么
+2. 分析这个问题的复杂程度
+3. 制定具体的执行步骤
+4. 考虑需要什么工具和资源
+
+请用自然语言表达你的思考过程，就像在和朋友讨论如何解决问题一样。
+
+现在开始分析用户输入："""
+
+
+def _dumps_indented(data: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """序列化为带缩进的JSON字符串（非ASCII字符原样输出，等价于ensure_ascii=False），default处理无法直接序列化的对象"""
+    return orjson.dumps(data, default=default, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _recent_history(conversation_history: Union[List[Dict], deque]) -> Iterable[Dict]:
+    """取最近几轮对话历史；调用方可传入deque(maxlen=MAX_CONVERSATION_HISTORY)自行维护窗口，此时不再切片"""
+    if isinstance(conversation_history, deque):
+        overflow = len(conversation_history) - MAX_CONVERSATION_HISTORY
+        return islice(conversation_history, overflow, None) if overflow > 0 else conversation_history
+    return conversation_history[-MAX_CONVERSATION_HISTORY:]
+
+
+def _ellipsize(text: str, limit: int) -> str:
+    """超过指定长度时截断并追加省略号，未超长时原样返回"""
+    return text if len(text) <= limit else f"{text[:limit]}..."
+
+
+def _estimate_tokens(text: str) -> int:
+    """粗略估算token数：非ASCII字符（中文等）约每字1个token，ASCII字符约每4个1个token"""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return len(text) - ascii_chars + (ascii_chars + 3) // 4
+
+
+def _format_history_message(msg: Dict) -> str:
+    """格式化单条对话历史，过长的内容截断到200字符"""
+    return f"{msg['role']}: {_ellipsize(msg['content'], 200)}"
+
+
+# 需要从思考内容中移除的markdown标记字符（#、*、`），一次扫描全部删除
+_MARKDOWN_STRIP_TABLE = str.maketrans("", "", "#*`")
+
+# 关键要点提取：按"。"逐句匹配，句首的常见连接词一次性移除
+_SENTENCE_RE = re.compile(r"[^。]+")
+_KEYPOINT_PREFIX_RE = re.compile(r"^(?:(?:首先|其次|然后|接着|最后|另外|此外|同时)\s*)+")
+
+# 执行计划解析：去除首尾空白后的非空行，以及行首的步骤标记（数字、列表符号、第N步）
+_PLAN_LINE_RE = re.compile(r"^\s*(\S.*?)\s*$", re.MULTILINE)
+_PLAN_STEP_RE = re.compile(r"(?P<num>\d)|(?P<bullet>[-•] )|(?P<ordinal>第[一二三四五]步)")
+
+# 工具描述中常见的功能关键词
+_COMMON_TOOL_KEYWORDS = (
+    "搜索",
+    "查询",
+    "查找",
+    "获取",
+    "读取",
+    "写入",
+    "保存",
+    "分析",
+    "计算",
+    "翻译",
+    "search",
+    "query",
+    "find",
+    "get",
+    "read",
+    "write",
+    "save",
+    "analyze",
+    "calculate",
+    "translate",
+    "学术",
+    "文献",
+    "论文",
+    "专利",
+    "网络",
+    "文件",
+    "代码",
+    "图像",
+    "图片",
+    "academic",
+    "literature",
+    "paper",
+    "patent",
+    "web",
+    "file",
+    "code",
+    "image",
+    "picture",
+)
+
+# 执行计划中的步骤标记
+_EXECUTION_STEP_MARKERS = ("1.", "2.", "3.", "4.", "5.", "第一步", "第二步", "第三步", "第四步", "第五步")
+
+# 执行内容中需要跳过的分析性开头
+_ANALYSIS_LINE_PREFIXES = (
+    "理解用户需求：",
+    "这是一个",
+    "需要区分",
+    "首先明确",
+    "特别关注：",
+    "所需工具和资源：",
+    "具体行动计划：",
+    "潜在挑战：",
+    "我现在将",
+    "您看这个计划",
+)
+
+# 可执行步骤的关键词
+_EXECUTABLE_KEYWORDS = (
+    "搜索",
+    "查找",
+    "查询",
+    "获取",
+    "检索",
+    "分析",
+    "计算",
+    "翻译",
+    "读取",
+    "写入",
+    "保存",
+    "下载",
+    "上传",
+    "处理",
+    "生成",
+    "创建",
+    "search",
+    "find",
+    "query",
+    "get",
+    "retrieve",
+    "analyze",
+    "calculate",
+    "translate",
+    "read",
+    "write",
+    "save",
+    "download",
+    "upload",
+    "process",
+    "generate",
+    "create",
+    "build",
+    "extract",
+    "parse",
+    "validate",
+)
+
+# 非执行步骤的关键词（描述性、分析性）
+_NON_EXECUTABLE_KEYWORDS = (
+    "理解",
+    "分析",
+    "评估",
+    "考虑",
+    "注意",
+    "关注",
+    "区分",
+    "明确",
+    "understand",
+    "analyze",
+    "evaluate",
+    "consider",
+    "note",
+    "focus",
+    "distinguish",
+    "clarify",
+    "这是",
+    "需要",
+    "应该",
+    "可能",
+    "潜在",
+)
+
+# 基于步骤描述的关键词推荐的默认工具
+_DEFAULT_TOOL_RECOMMENDATIONS = {
+    "搜索": ("web_search", "article_search_articles"),
+    "查找": ("web_search", "article_search_articles"),
+    "查询": ("web_search", "article_search_articles"),
+    "检索": ("web_search", "article_search_articles"),
+    "文献": ("pubmed_pubmed_query_page", "biorxiv_advanced_search"),
+    "论文": ("pubmed_pubmed_query_page", "biorxiv_advanced_search"),
+    "学术": ("pubmed_pubmed_query_page", "biorxiv_advanced_search"),
+    "翻译": ("translator",),
+    "计算": ("calculator",),
+    "分析": ("web_search", "article_search_articles"),
+    "获取": ("web_search", "article_search_articles"),
+    "search": ("web_search", "article_search_articles"),
+    "find": ("web_search", "article_search_articles"),
+    "query": ("web_search", "article_search_articles"),
+    "literature": ("pubmed_pubmed_query_page", "biorxiv_advanced_search"),
+    "paper": ("pubmed_pubmed_query_page", "biorxiv_advanced_search"),
+    "academic": ("pubmed_pubmed_query_page", "biorxiv_advanced_search"),
+    "translate": ("translator",),
+    "calculate": ("calculator",),
+    "analyze": ("web_search", "article_search_articles"),
+}
+
+# 没有特定推荐时作为通用搜索工具的名称关键词
+_GENERIC_SEARCH_TOOL_KEYWORDS = ("search", "query", "web")
+
+# 工具类型和对应的关键词
+_TOOL_CATEGORY_KEYWORDS = {
+    "search": ("搜索", "查找", "查询", "获取信息", "了解", "search", "find", "query"),
+    "analysis": ("分析", "评估", "计算", "统计", "analyze", "calculate", "evaluate"),
+    "translation": ("翻译", "转换", "translate", "convert"),
+    "file": ("文件", "读取", "写入", "保存", "file", "read", "write", "save"),
+    "web": ("网络", "网页", "网站", "web", "url", "link"),
+    "code": ("代码", "编程", "开发", "code", "program", "develop"),
+}
+
+# 无需深度思考的简单输入（问候、致谢、告别），直接生成单步计划；命令类输入需要调用工具，不在此列
+_TRIVIAL_INPUT_RE = re.compile(
+    r"(?:hi|hello|hey|你好|您好|在吗|thanks?|thank you|谢谢|多谢|再见|bye)[\s!！。.~～?？]*", re.IGNORECASE
+)
+
+# 结构化思考缓存：用户输入中的URL、路径和较长的数字作为槽位，其余文本相同的输入共用一个思考结果模板
+_SLOT_RE = re.compile(r"https?://\S+|(?:[A-Za-z]:)?(?:[\w.~-]*[/\\])+[\w.~-]+|\d+\.\d+|\d{3,}")
+_SLOT_MARK = "\x00slot{}\x00"
+_SLOT_MARK_RE = re.compile(r"\x00slot(\d+)\x00")
+# 槽位值只在词边界处匹配，避免"100"匹配到"1000"或"1.100"中的一部分
+_SLOT_BOUNDARY = r"(?<![\w./\\:-]){}(?![\w/\\-]|\.\w)"
+
+
+def _slot_pattern(value: str) -> re.Pattern:
+    """构建只在词边界处匹配槽位值的正则"""
+    return re.compile(_SLOT_BOUNDARY.format(re.escape(value)), re.ASCII)
+
+
+def _slot_fragments(value: str) -> List[str]:
+    """槽位值可能被LLM改写出的片段：去掉协议的URL、路径的最后一段"""
+    fragments = {value.split("://", 1)[-1].rstrip("/"), re.split(r"[/\\]", value.rstrip("/\\"))[-1]}
+    fragments.discard("")
+    return list(fragments)
+
+
+def _extract_slots(user_input: str) -> Tuple[str, List[str]]:
+    """把用户输入中的实体替换为槽位标记，返回(结构化模板, 槽位值列表)"""
+    slots: List[str] = []
+
+    def _mark(match: re.Match) -> str:
+        slots.append(match.group())
+        return _SLOT_MARK.format(len(slots) - 1)
+
+    return _SLOT_RE.sub(_mark, user_input), slots
+
+
+def _replace_in_value(value: Any, replace) -> Any:
+    """对字符串及嵌套在列表、字典中的字符串应用替换函数，返回新对象"""
+    if isinstance(value, str):
+        return replace(value)
+    if isinstance(value, list):
+        return [_replace_in_value(item, replace) for item in value]
+    if isinstance(value, dict):
+        return {key: _replace_in_value(item, replace) for key, item in value.items()}
+    return value
+
+
+def _map_result_text(result: "ThinkingResult", replace) -> "ThinkingResult":
+    """复制思考结果，并对其中的文本字段应用替换函数"""
+    return ThinkingResult(
+        user_intent=replace(result.user_intent),
+        problem_analysis=replace(result.problem_analysis),
+        execution_plan=[
+            ThinkingStep(
+                step_id=step.step_id,
+                description=replace(step.description),
+                reasoning=replace(step.reasoning),
+                expected_tools=list(step.expected_tools),
+                parameters=_replace_in_value(step.parameters, replace),
+                priority=step.priority,
+                dependencies=list(step.dependencies),
+            )
+            for step in result.execution_plan
+        ],
+        estimated_complexity=result.estimated_complexity,
+        suggested_model=result.suggested_model,
+        context_requirements=_replace_in_value(result.context_requirements, replace),
+        timestamp=datetime.now(),
+    )
+
+
+# 章节切分：只匹配已知的章节标题，章节内容为标题之后直到下一个已知标题或文本结束的部分，
+# 正文中零散的"**"（如"2**10"或其他加粗文本）不会影响切分
+_SECTION_NAMES = ("用户意图分析", "问题背景理解", "执行计划制定", "复杂度评估", "建议模型")
+_SECTION_RE = re.compile(r"\*\*(" + "|".join(_SECTION_NAMES) + r")\*\*")
+
+# 复杂度评估关键词：低复杂度关键词优先于高复杂度关键词
+_ASSESS_COMPLEXITY_RE = re.compile(r"(?P<low>简单|基础|容易|直接)|(?P<high>复杂|困难|高级|专业)")
+_EXTRACT_COMPLEXITY_RE = re.compile(r"(?P<low>简单|low|easy)|(?P<high>复杂|high|difficult)", re.IGNORECASE)
+
+_COMPLEXITY_LABELS = {
+    "low": "🟢 **复杂度**: low",
+    "medium": "🟡 **复杂度**: medium",
+    "high": "🔴 **复杂度**: high",
+}
+
+
+def _classify_complexity(text: str, pattern: re.Pattern) -> str:
+    """单次扫描文本判断复杂度：出现低复杂度关键词即为low，否则出现高复杂度关键词为high，都没有为medium"""
+    level = "medium"
+    for match in pattern.finditer(text):
+        if match.lastgroup == "low":
+            return "low"
+        level = "high"
+    return level
+
+
+class _IncrementalThinkingParser:
+    """
+    随流式分块增量处理思考内容：逐个完整行清理markdown标记并评估复杂度，
+    流结束时得到与_strip_markdown、_assess_complexity整体处理相同的结果，无需再扫描全文
+    """
+
+    __slots__ = ("_tail_parts", "_lines", "_complexity")
+
+    def __init__(self):
+        self._tail_parts: List[str] = []
+        self._lines: List[str] = []
+        self._complexity = "medium"
+
+    def feed(self, chunk: str):
+        """处理新到达的分块，未结束的行暂存到下一个换行符出现"""
+        if "\n" not in chunk:
+            self._tail_parts.append(chunk)
+            return
+
+        first, *rest = chunk.split("\n")
+        self._tail_parts.append(first)
+        self._add_line("".join(self._tail_parts))
+        for line in rest[:-1]:
+            self._add_line(line)
+        self._tail_parts = [rest[-1]]
+
+    def finish(self) -> Tuple[str, str]:
+        """
+        处理剩余内容
+
+        Returns:
+            Tuple[str, str]: (清理后的内容, 复杂度 low/medium/high)
+        """
+        self._add_line("".join(self._tail_parts))
+        self._tail_parts = []
+        return "\n".join(self._lines), self._complexity
+
+    def _add_line(self, line: str):
+        line = line.translate(_MARKDOWN_STRIP_TABLE).strip()
+        if not line:
+            return
+        self._lines.append(line)
+        # 关键词不会跨行，逐行评估与整体评估结果一致；出现低复杂度关键词后结果不再变化
+        if self._complexity != "low":
+            level = _classify_complexity(line, _ASSESS_COMPLEXITY_RE)
+            if level != "medium":
+                self._complexity = level
+
+
+def _strip_markdown(content: str) -> str:
+    """移除markdown标记并去掉空行和每行首尾的空白"""
+    if not content:
+        return ""
+    content = content.translate(_MARKDOWN_STRIP_TABLE)
+    return "\n".join(filter(None, map(str.strip, content.split("\n"))))
+
+
+def _tools_fingerprint(mcp_tools: List) -> Tuple[Tuple[str, str], ...]:
+    """提取工具列表的(名称, 描述)指纹，作为prompt缓存的键"""
+    return tuple((getattr(tool, "name", str(tool)), getattr(tool, "description", "无描述")) for tool in mcp_tools)
+
+
+@lru_cache(maxsize=32)
+def _create_llm_cached(provider: str, model_name: str, config_items: Tuple[Tuple[str, Any], ...]) -> BaseChatModel:
+    """按(提供商, 模型, 配置)缓存LLM实例，多个思考Agent共享同一客户端及其连接池"""
+    return LLMFactory.create_llm(provider=provider, model=model_name, **dict(config_items))
+
+
+def _get_shared_llm(provider: str, model_name: str, llm_config: Dict[str, Any]) -> BaseChatModel:
+    """获取共享的LLM实例；配置中含有不可哈希的值时无法作为缓存键，直接创建新实例"""
+    config_items = tuple(sorted(llm_config.items()))
+    try:
+        hash(config_items)
+    except TypeError:
+        return LLMFactory.create_llm(provider=provider, model=model_name, **llm_config)
+    return _create_llm_cached(provider, model_name, config_items)
+
+
+@lru_cache(maxsize=32)
+def _build_thinking_prompt_cached(tools_fingerprint: Tuple[Tuple[str, str], ...]) -> str:
+    """根据工具指纹构建思考prompt，相同工具集的Agent共享同一个prompt"""
+    if not tools_fingerprint:
+        return _THINKING_PROMPT_BASE
+
+    parts = [_THINKING_PROMPT_BASE, "\n\n📋 **可用的工具列表**:\n"]
+    parts.extend(f"{i}. **{tool_name}**: {tool_desc}\n" for i, (tool_name, tool_desc) in enumerate(tools_fingerprint, 1))
+    parts.append("\n💡 **提示**: 在制定执行计划时，请考虑使用上述工具来完成特定任务。")
+    return "".join(parts)
+
+
+@dataclass(slots=True)
 class ThinkingStep:
     """思考步骤"""
 
@@ -32,8 +451,39 @@ class ThinkingStep:
     priority: int = 1
     dependencies: List[str] = field(default_factory=list)
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], step_number: int = 1) -> "ThinkingStep":
+        """
+        从字典构建步骤，缺失的字段使用默认值，多余的字段忽略
+
+        Args:
+            data: 步骤字典（如thinking_data中的execution_plan项）
+            step_number: 步骤序号，缺少step_id时用于生成ID
+
+        Returns:
+            ThinkingStep: 思考步骤
+        """
+        # ThinkingAgent生成的步骤字典字段完整，直接按关键字构建
+        if data.keys() == _STEP_FIELD_SET:
+            return cls(**data)
+        get = data.get
+        return cls(
+            get("step_id", f"step_{step_number}"),
+            get("description", ""),
+            get("reasoning", ""),
+            get("expected_tools", []),
+            get("parameters", {}),
+            get("priority", 1),
+            get("dependencies", []),
+        )
+
 
-@dataclass
+# ThinkingStep的字段名，用于列式序列化
+_STEP_FIELD_NAMES = tuple(f.name for f in fields(ThinkingStep))
+_STEP_FIELD_SET = frozenset(_STEP_FIELD_NAMES)
+
+
+@dataclass(slots=True)
 class ThinkingResult:
     """思考结果"""
 
@@ -43,13 +493,40 @@ class ThinkingResult:
     estimated_complexity: str  # low, medium, high
     suggested_model: Optional[str] = None
     context_requirements: Dict[str, Any] = field(default_factory=dict)
-    timestamp: Optional[datetime] = None
+    timestamp: Optional[datetime] = field(default_factory=datetime.now)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为按步骤存储的字典，执行计划为每个步骤一个字典
+
+        Returns:
+            Dict[str, Any]: 可直接JSON序列化的字典
+        """
+        return {
+            "user_intent": self.user_intent,
+            "problem_analysis": self.problem_analysis,
+            "execution_plan": [{name: getattr(step, name) for name in _STEP_FIELD_NAMES} for step in self.execution_plan],
+            "estimated_complexity": self.estimated_complexity,
+            "suggested_model": self.suggested_model,
+            "context_requirements": self.context_requirements,
+            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
+        }
 
 
 class ThinkingAgent:
     """思考Agent - 专门负责分析和规划，不执行实际操作"""
 
-    def __init__(self, provider: str = "deepseek", model_name: str = "deepseek-chat", mcp_tools: List = None, **llm_kwargs):
+    def __init__(
+        self,
+        provider: str = "deepseek",
+        model_name: str = "deepseek-chat",
+        mcp_tools: List = None,
+        stream_batch_ms: float = DEFAULT_STREAM_BATCH_MS,
+        stream_batch_max: int = DEFAULT_STREAM_BATCH_MAX,
+        think_cache_size: int = DEFAULT_THINK_CACHE_SIZE,
+        input_token_budget: int = DEFAULT_INPUT_TOKEN_BUDGET,
+        **llm_kwargs,
+    ):
         """
         初始化思考Agent
 
@@ -57,11 +534,19 @@ class ThinkingAgent:
             provider: LLM提供商（建议使用推理能力强的模型）
             model_name: 模型名称
             mcp_tools: MCP工具列表（用于分析可用工具）
+            stream_batch_ms: 流式思考时合并输出分块的最长时间（毫秒）
+            stream_batch_max: 流式思考时单次输出最多合并的分块数
+            think_cache_size: 结构化思考缓存的最大条目数，为0时不缓存
+            input_token_budget: 用户消息（上下文、对话历史、用户输入）的估算token上限，对话历史在剩余额度内按从新到旧装入
             **llm_kwargs: 传递给LLM的额外参数
         """
         self.provider = provider
         self.model_name = model_name
         self.mcp_tools = mcp_tools or []
+        self.stream_batch_ms = stream_batch_ms
+        self.stream_batch_max = stream_batch_max
+        self.think_cache_size = think_cache_size
+        self.input_token_budget = input_token_budget
         self.llm_kwargs = llm_kwargs
 
         # 性能统计
@@ -70,15 +555,34 @@ class ThinkingAgent:
             "successful_requests": 0,
             "failed_requests": 0,
             "average_response_time": 0.0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "direct_responses": 0,
         }
 
+        # 结构化思考缓存：(输入模板, 上下文, 对话历史) -> 带槽位标记的思考结果
+        self._think_cache: Dict[Tuple, ThinkingResult] = {}
+
         # 初始化LLM（使用更高的temperature以获得更多创造性思考）
         llm_config = {"temperature": DEFAULT_TEMPERATURE, "max_tokens": DEFAULT_MAX_TOKENS, **llm_kwargs}
 
-        self.llm = LLMFactory.create_llm(provider=provider, model=model_name, **llm_config)
+        self.llm = _get_shared_llm(provider, model_name, llm_config)
+
+        # 上下文序列化缓存：id(context) -> (内容哈希, JSON字符串)，同一上下文重复思考时不再重新编码
+        self._ctx_cache: Dict[int, Tuple[int, str]] = {}
+
+        # 工具指纹（名称、描述），构建prompt和提取建议工具时复用
+        self._tools_fp = _tools_fingerprint(self.mcp_tools)
+
+        # 每个工具的(小写名称, 描述中出现的功能关键词)，工具集固定，只需计算一次
+        self._tool_keyword_sets = [
+            (tool_name.lower(), frozenset(self._extract_tool_keywords(tool_desc))) for tool_name, tool_desc in self._tools_fp
+        ]
 
         # 思考prompt模板
         self.thinking_prompt = self._build_thinking_prompt()
+        # 固定的思考prompt作为系统消息放在每次请求的最前面，便于LLM服务端复用前缀缓存
+        self._thinking_system_message = self._build_thinking_system_message()
 
         logger.info(f"ThinkingAgent initialized with {provider}/{model_name}, {len(self.mcp_tools)} MCP tools available")
 
@@ -116,34 +620,17 @@ class ThinkingAgent:
         )
 
     def _build_thinking_prompt(self) -> str:
-        """构建思考Agent的prompt模板 - 包含可用工具信息"""
-        prompt = """你是一个专业的AI思考助手，负责分析用户输入并制定处理计划。
-
-请以自然、流畅的方式分析用户的需求，并制定执行计划。你可以这样思考：
-
-1. 首先理解用户想要什么
-2. 分析这个问题的复杂程度
-3. 制定具体的执行步骤
-4. 考虑需要什么工具和资源
-
-请用自然语言表达你的思考过程，就像在和朋友讨论如何解决问题一样。
-
-现在开始分析用户输入："""
-
-        # 如果有可用的MCP工具，添加到prompt中
-        if self.mcp_tools:
-            prompt += "\n\n📋 **可用的工具列表**:\n"
-            for i, tool in enumerate(self.mcp_tools, 1):
-                tool_name = getattr(tool, "name", str(tool))
-                tool_desc = getattr(tool, "description", "无描述")
-                prompt += f"{i}. **{tool_name}**: {tool_desc}\n"
-
-            prompt += "\n💡 **提示**: 在制定执行计划时，请考虑使用上述工具来完成特定任务。"
+        """构建思考Agent的prompt模板 - 包含可用工具信息（按工具集缓存）"""
+        return _build_thinking_prompt_cached(self._tools_fp)
 
-        return prompt
+    def _build_thinking_system_message(self) -> SystemMessage:
+        """构建思考prompt系统消息；Anthropic需要显式标记缓存断点，其他提供商自动缓存相同前缀"""
+        if isinstance(self.llm, ChatAnthropic):
+            return SystemMessage(content=[{"type": "text", "text": self.thinking_prompt, "cache_control": {"type": "ephemeral"}}])
+        return SystemMessage(content=self.thinking_prompt)
 
     async def think(
-        self, user_input: str, context: Optional[Dict[str, Any]] = None, conversation_history: Optional[List[Dict]] = None
+        self, user_input: str, context: Optional[Dict[str, Any]] = None, conversation_history: Optional[Union[List[Dict], deque]] = None
     ) -> ThinkingResult:
         """
         分析用户输入并生成思考结果
@@ -161,6 +648,12 @@ class ThinkingAgent:
             logger.warning("用户输入为空，返回默认思考结果")
             return self._create_fallback_result("用户输入为空")
 
+        # 简单输入不调用LLM，直接返回单步计划
+        if _TRIVIAL_INPUT_RE.fullmatch(user_input.strip()):
+            self.stats["direct_responses"] += 1
+            logger.info(f"ThinkingAgent跳过简单输入的深度思考: {user_input[:100]}")
+            return self._create_direct_result(user_input)
+
         # 性能监控
         import time
 
@@ -168,16 +661,30 @@ class ThinkingAgent:
         self.stats["total_requests"] += 1
 
         try:
-            # 构建完整的思考输入
-            thinking_input = self._build_thinking_input(user_input, context, conversation_history)
+            # 结构相同（仅URL、路径、数字等实体不同）的请求直接复用之前的思考结果
+            cache_key, slots = self._think_cache_key(user_input, context, conversation_history)
+            result = self._get_cached_thinking(cache_key, slots)
+            if result is not None:
+                # 命中缓存同样计为成功请求，命中次数单独记录在cache_hits中
+                logger.info(f"ThinkingAgent命中思考缓存: {user_input[:100]}...")
+            else:
+                # 构建完整的思考输入
+                thinking_input = self._build_thinking_input(user_input, context, conversation_history)
 
-            logger.info(f"ThinkingAgent开始分析用户输入: {user_input[:100]}...")
+                logger.info(f"ThinkingAgent开始分析用户输入: {user_input[:100]}...")
 
-            # 调用LLM进行思考
-            response = await self.llm.ainvoke(thinking_input)
+                # 调用LLM进行思考
+                response = await self.llm.ainvoke(thinking_input)
 
-            # 解析思考结果
-            result = self._parse_thinking_response(response.content)
+                usage = getattr(response, "response_metadata", {}).get("token_usage") or {}
+                if "prompt_cache_hit_tokens" in usage:
+                    logger.debug("ThinkingAgent prompt缓存命中 %s tokens", usage["prompt_cache_hit_tokens"])
+
+                # 解析思考结果（纯CPU计算，放到工作线程中执行，避免阻塞事件循环上的其他请求）
+                result, parsed = await asyncio.to_thread(self._parse_thinking_response_checked, response.content)
+                # 解析失败的回退结果不缓存
+                if parsed:
+                    self._store_cached_thinking(cache_key, slots, result)
 
             # 更新性能统计
             end_time = time.time()
@@ -198,7 +705,39 @@ class ThinkingAgent:
             # 返回基础的思考结果
             return self._create_fallback_result(user_input)
 
-    async def think_stream(self, user_input: str, context: Optional[Dict[str, Any]] = None, conversation_history: Optional[List[Dict]] = None):
+    async def think_batch(
+        self,
+        inputs: List[str],
+        context: Optional[Dict[str, Any]] = None,
+        conversation_history: Optional[Union[List[Dict], deque]] = None,
+        max_concurrency: int = 8,
+    ) -> List[ThinkingResult]:
+        """
+        并发分析多条用户输入
+
+        Args:
+            inputs: 用户输入列表
+            context: 上下文信息，所有输入共用
+            conversation_history: 对话历史，所有输入共用
+            max_concurrency: 同时进行的LLM请求数上限
+
+        Returns:
+            List[ThinkingResult]: 与inputs顺序一致的思考结果，失败的项为基础思考结果
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _think(user_input: str) -> ThinkingResult:
+            async with semaphore:
+                return await self.think(user_input, context, conversation_history)
+
+        results = await asyncio.gather(*[_think(user_input) for user_input in inputs])
+
+        logger.info(f"ThinkingAgent已并发分析{len(inputs)}条用户输入")
+        return list(results)
+
+    async def think_stream(
+        self, user_input: str, context: Optional[Dict[str, Any]] = None, conversation_history: Optional[Union[List[Dict], deque]] = None
+    ):
         """
         流式思考方法 - 真正的流式输出，参考 execution agent 的实现
 
@@ -210,6 +749,9 @@ class ThinkingAgent:
         Yields:
             Dict[str, Any]: 流式思考数据
         """
+        # 绑定为局部名称，流式循环中每次输出都要取时间戳
+        now = datetime.now
+
         # 输入验证
         if not user_input or not user_input.strip():
             logger.warning("用户输入为空，返回错误信息")
@@ -217,7 +759,7 @@ class ThinkingAgent:
                 "type": "thinking_error",
                 "content": "🚫 用户输入为空，无法进行分析",
                 "phase": "thinking",
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now().isoformat(),
             }
             return
 
@@ -228,76 +770,87 @@ class ThinkingAgent:
             logger.info(f"ThinkingAgent开始流式分析用户输入: {user_input[:100]}...")
 
             # 使用真正的流式调用，参考 execution agent 的实现
-            full_response = ""
+            response_parts = []
+
+            # 合并短时间内到达的分块后再输出，减少下游逐块转发和序列化的开销
+            pending_chunks = []
+            loop = asyncio.get_running_loop()
+            batch_interval = self.stream_batch_ms / 1000
+            last_flush = loop.time()
+            # 分块时间戳按间隔刷新，连续按数量触发的输出不必每次都取当前时间并格式化
+            chunk_timestamp = now().isoformat()
+            timestamp_at = last_flush
+
+            # 分块到达时即增量清理内容、评估复杂度，流结束后不再整体扫描
+            parser = _IncrementalThinkingParser()
 
             async for chunk in self.llm.astream(thinking_input):
                 if hasattr(chunk, "content") and chunk.content:
                     content = str(chunk.content)
-                    full_response += content
-
-                    # 真正的流式输出：立即输出每个chunk，不缓冲
-                    yield {
-                        "type": "thinking_chunk",
-                        "content": content,
-                        "phase": "thinking",
-                        "timestamp": datetime.now().isoformat(),
-                    }
+                    response_parts.append(content)
+                    pending_chunks.append(content)
+                    parser.feed(content)
+
+                    loop_now = loop.time()
+                    if len(pending_chunks) >= self.stream_batch_max or loop_now - last_flush >= batch_interval:
+                        if loop_now - timestamp_at >= STREAM_TIMESTAMP_REFRESH:
+                            chunk_timestamp = now().isoformat()
+                            timestamp_at = loop_now
+                        yield {
+                            "type": "thinking_chunk",
+                            "content": "".join(pending_chunks),
+                            "phase": "thinking",
+                            "timestamp": chunk_timestamp,
+                        }
+                        pending_chunks = []
+                        last_flush = loop_now
+
+            # 输出剩余的分块
+            if pending_chunks:
+                yield {
+                    "type": "thinking_chunk",
+                    "content": "".join(pending_chunks),
+                    "phase": "thinking",
+                    "timestamp": now().isoformat(),
+                }
+
+            full_response = "".join(response_parts)
 
             # 思考完成，创建JSON格式的结构化数据
             if full_response:
-                # 创建结构化的思考结果
-                thinking_result = self._create_structured_result(full_response, user_input)
-
-                # 解析JSON字符串为字典，用于后续处理
-                try:
-                    thinking_data = json.loads(thinking_result)
-                except json.JSONDecodeError:
-                    # 如果JSON解析失败，创建基础数据结构
-                    thinking_data = {
-                        "status": "completed",
-                        "user_input": user_input,
-                        "user_intent": user_input[:200] + "..." if len(user_input) > 200 else user_input,
-                        "problem_analysis": "思考分析完成",
-                        "execution_plan": [
-                            {
-                                "step_id": "step_1",
-                                "description": "基于思考结果执行用户请求",
-                                "reasoning": "根据AI的思考分析执行任务",
-                                "expected_tools": [],
-                                "parameters": {},
-                                "priority": 1,
-                                "dependencies": [],
-                            }
-                        ],
-                        "complexity": "medium",
-                        "complexity_level": "medium",
-                    }
+                # 创建结构化的思考结果，字典直接供后续处理使用，无需再从JSON字符串解析
+                cleaned_response, complexity_level = parser.finish()
+                thinking_data = await asyncio.to_thread(
+                    self._create_structured_data, full_response, user_input, cleaned_response, complexity_level
+                )
+                thinking_result = _dumps_indented(thinking_data)
 
                 yield {
                     "type": "thinking_complete",
                     "content": thinking_result,  # 保持原有的content字段
                     "thinking_data": thinking_data,  # 添加thinking_data字段供coordinator使用
                     "phase": "thinking",
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": now().isoformat(),
                 }
 
             logger.info("ThinkingAgent完成流式分析")
 
         except Exception as e:
             logger.error(f"ThinkingAgent流式思考过程出错: {str(e)}")
+            now_iso = now().isoformat()
 
             yield {
                 "type": "thinking_error",
                 "content": f"🚫 思考过程遇到错误: {str(e)}",
                 "phase": "thinking",
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso,
             }
 
             # 创建简单的备用结果 - JSON格式
             fallback_plan = [
                 {
                     "step_id": "step_1",
-                    "description": f"处理用户请求: {user_input[:100]}{'...' if len(user_input) > 100 else ''}",
+                    "description": f"处理用户请求: {_ellipsize(user_input, 100)}",
                     "reasoning": "思考Agent出错，直接处理用户输入",
                     "expected_tools": [],  # 不预设工具，让执行Agent决定
                     "parameters": {},
@@ -309,7 +862,7 @@ class ThinkingAgent:
             fallback_result = {
                 "status": "error",
                 "user_input": user_input,
-                "user_intent": user_input[:200] + "..." if len(user_input) > 200 else user_input,
+                "user_intent": _ellipsize(user_input, MAX_USER_INPUT_LENGTH),
                 "problem_analysis": "思考过程遇到问题，将直接处理用户请求",
                 "key_points": ["系统将直接处理用户请求"],
                 "execution_plan": fallback_plan,
@@ -319,16 +872,16 @@ class ThinkingAgent:
                 "context_requirements": {},
                 "suggested_tools": [],  # 不预设工具
                 "thinking_duration": "error",
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso,
                 "metadata": {"response_length": 0, "key_points_count": 1, "analysis_quality": "error", "plan_steps": 1},
             }
 
             yield {
                 "type": "thinking_complete",
-                "content": json.dumps(fallback_result, ensure_ascii=False, indent=2),
+                "content": _dumps_indented(fallback_result),
                 "thinking_data": fallback_result,  # 添加thinking_data字段供coordinator使用
                 "phase": "thinking",
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso,
             }
 
     def _create_simple_summary(self, full_response: str, user_input: str) -> str:
@@ -341,7 +894,7 @@ class ThinkingAgent:
         summary_parts = []
 
         # 1. 用户意图（从用户输入提取）
-        user_intent = user_input[:100] + "..." if len(user_input) > 100 else user_input
+        user_intent = _ellipsize(user_input, 100)
         summary_parts.append(f"🎯 **用户需求**: {user_intent}")
 
         # 2. 思考要点（从AI响应中提取）
@@ -363,37 +916,20 @@ class ThinkingAgent:
 
     def _clean_summary_content(self, content: str) -> str:
         """清理总结内容，移除markdown标记等"""
-        if not content:
-            return ""
-
-        # 移除markdown标记
-        content = content.replace("###", "").replace("##", "").replace("#", "")
-        content = content.replace("**", "").replace("*", "")
-        content = content.replace("```", "").replace("`", "")
-
-        # 移除多余的空白字符
-        lines = [line.strip() for line in content.split("\n") if line.strip()]
-        content = "\n".join(lines)
-
-        return content
+        return _strip_markdown(content)
 
     def _extract_key_points(self, content: str) -> List[str]:
         """从内容中提取关键要点"""
         points = []
 
-        # 按句子分割
-        sentences = content.split("。")
-
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if len(sentence) > 15 and len(sentence) < 120:  # 合适的长度
+        # 逐句匹配，不预先切分整个内容；凑满3个要点即停止
+        for match in _SENTENCE_RE.finditer(content):
+            sentence = match.group().strip()
+            if 15 < len(sentence) < 120:  # 合适的长度
                 # 移除常见的开头词
-                clean_sentence = sentence
-                for prefix in ["首先", "其次", "然后", "接着", "最后", "另外", "此外", "同时"]:
-                    if clean_sentence.startswith(prefix):
-                        clean_sentence = clean_sentence[len(prefix) :].strip()
+                clean_sentence = _KEYPOINT_PREFIX_RE.sub("", sentence, count=1)
 
-                if clean_sentence and len(clean_sentence) > 10:
+                if len(clean_sentence) > 10:
                     points.append(clean_sentence)
 
                 # 最多提取3个要点
@@ -404,20 +940,11 @@ class ThinkingAgent:
 
     def _assess_complexity(self, content: str) -> str:
         """评估复杂度"""
-        content_lower = content.lower()
-
-        # 简单判断逻辑
-        if any(word in content_lower for word in ["简单", "基础", "容易", "直接"]):
-            return "🟢 **复杂度**: low"
-        elif any(word in content_lower for word in ["复杂", "困难", "高级", "专业"]):
-            return "🔴 **复杂度**: high"
-        else:
-            return "🟡 **复杂度**: medium"
+        return _COMPLEXITY_LABELS[_classify_complexity(content, _ASSESS_COMPLEXITY_RE)]
 
     def _extract_suggested_tools(self, content: str, execution_plan: Optional[List[ThinkingStep]] = None) -> List[str]:
         """从思考内容中提取建议的工具，基于执行计划和实际可用的MCP工具"""
         suggested_tools = []
-        content_lower = content.lower()
 
         if not self.mcp_tools:
             return suggested_tools
@@ -430,26 +957,19 @@ class ThinkingAgent:
 
         # 如果执行计划中没有工具信息，则从思考内容中智能提取
         if not suggested_tools:
-            # 遍历可用的MCP工具，检查是否在思考内容中被提及
-            for tool in self.mcp_tools:
-                tool_name = getattr(tool, "name", str(tool)).lower()
-                tool_desc = getattr(tool, "description", "").lower()
-
-                # 检查工具名称是否在内容中被提及
-                if tool_name in content_lower:
-                    suggested_tools.append(tool_name)
-                    continue
-
-                # 检查工具描述中的关键词是否在内容中被提及
-                # 提取描述中的关键词（通常是功能描述）
-                desc_keywords = self._extract_tool_keywords(tool_desc)
-                for keyword in desc_keywords:
-                    if keyword in content_lower:
-                        suggested_tools.append(tool_name)
-                        break
+            content_lower = content.lower()
+            # 先找出内容中出现的功能关键词，每个关键词只扫描一次内容
+            content_keywords = frozenset(keyword for keyword in _COMMON_TOOL_KEYWORDS if keyword in content_lower)
+
+            # 遍历可用的MCP工具，检查工具名称或其描述中的关键词是否在思考内容中被提及
+            suggested_tools = [
+                tool_name
+                for tool_name, keywords in self._tool_keyword_sets
+                if tool_name in content_lower or not keywords.isdisjoint(content_keywords)
+            ]
 
         # 去重并返回
-        return list(set(suggested_tools))
+        return list(dict.fromkeys(suggested_tools))
 
     def _extract_tools_from_plan(self, execution_plan: List[ThinkingStep]) -> List[str]:
         """从执行计划中提取需要的工具"""
@@ -466,12 +986,11 @@ class ThinkingAgent:
         # 清理内容，移除不必要的部分
         cleaned_content = self._clean_execution_content(content)
 
-        # 尝试从内容中提取多个执行步骤
-        # 按常见的步骤标记分割
-        step_markers = ["1.", "2.", "3.", "4.", "5.", "第一步", "第二步", "第三步", "第四步", "第五步"]
-
+        # 尝试从内容中提取多个执行步骤，按常见的步骤标记分割
         lines = cleaned_content.split("\n")
         current_plan = None
+        # 当前计划的描述片段，保存计划时一次性拼接，避免逐行字符串累加
+        description_parts: List[str] = []
 
         for line in lines:
             line = line.strip()
@@ -479,23 +998,16 @@ class ThinkingAgent:
                 continue
 
             # 检查是否是新的步骤开始
-            is_new_step = False
-            for marker in step_markers:
-                if line.startswith(marker):
-                    is_new_step = True
-                    break
+            marker = next((m for m in _EXECUTION_STEP_MARKERS if line.startswith(m)), None)
 
-            if is_new_step:
+            if marker is not None:
                 # 保存前一个计划
                 if current_plan:
+                    current_plan["description"] = " ".join(description_parts)
                     plans.append(current_plan)
 
                 # 创建新计划
-                step_desc = line
-                for marker in step_markers:
-                    if line.startswith(marker):
-                        step_desc = line[len(marker) :].strip()
-                        break
+                step_desc = line[len(marker) :].strip()
 
                 # 检查这个步骤是否值得执行（过滤掉描述性、分析性的步骤）
                 if self._is_executable_step(step_desc):
@@ -508,14 +1020,16 @@ class ThinkingAgent:
                         "priority": len(plans) + 1,
                         "dependencies": [],
                     }
+                    description_parts = [step_desc]
                 else:
                     current_plan = None
             elif current_plan:
                 # 继续添加到当前计划
-                current_plan["description"] += f" {line}"
+                description_parts.append(line)
 
         # 添加最后一个计划
         if current_plan:
+            current_plan["description"] = " ".join(description_parts)
             plans.append(current_plan)
 
         # 如果没有找到明确的步骤，创建一个默认计划
@@ -544,20 +1058,6 @@ class ThinkingAgent:
         if not content:
             return ""
 
-        # 移除常见的分析性开头
-        analysis_prefixes = [
-            "理解用户需求：",
-            "这是一个",
-            "需要区分",
-            "首先明确",
-            "特别关注：",
-            "所需工具和资源：",
-            "具体行动计划：",
-            "潜在挑战：",
-            "我现在将",
-            "您看这个计划",
-        ]
-
         lines = content.split("\n")
         cleaned_lines = []
 
@@ -567,13 +1067,7 @@ class ThinkingAgent:
                 continue
 
             # 跳过分析性的行
-            skip_line = False
-            for prefix in analysis_prefixes:
-                if line.startswith(prefix):
-                    skip_line = True
-                    break
-
-            if not skip_line:
+            if not line.startswith(_ANALYSIS_LINE_PREFIXES):
                 cleaned_lines.append(line)
 
         return "\n".join(cleaned_lines)
@@ -582,76 +1076,11 @@ class ThinkingAgent:
         """判断步骤是否可执行（需要实际工具操作）"""
         step_lower = step_description.lower()
 
-        # 可执行步骤的关键词
-        executable_keywords = [
-            "搜索",
-            "查找",
-            "查询",
-            "获取",
-            "检索",
-            "分析",
-            "计算",
-            "翻译",
-            "读取",
-            "写入",
-            "保存",
-            "下载",
-            "上传",
-            "处理",
-            "生成",
-            "创建",
-            "search",
-            "find",
-            "query",
-            "get",
-            "retrieve",
-            "analyze",
-            "calculate",
-            "translate",
-            "read",
-            "write",
-            "save",
-            "download",
-            "upload",
-            "process",
-            "generate",
-            "create",
-            "build",
-            "extract",
-            "parse",
-            "validate",
-        ]
-
-        # 非执行步骤的关键词（描述性、分析性）
-        non_executable_keywords = [
-            "理解",
-            "分析",
-            "评估",
-            "考虑",
-            "注意",
-            "关注",
-            "区分",
-            "明确",
-            "understand",
-            "analyze",
-            "evaluate",
-            "consider",
-            "note",
-            "focus",
-            "distinguish",
-            "clarify",
-            "这是",
-            "需要",
-            "应该",
-            "可能",
-            "潜在",
-        ]
-
         # 检查是否包含可执行关键词
-        has_executable = any(keyword in step_lower for keyword in executable_keywords)
+        has_executable = any(keyword in step_lower for keyword in _EXECUTABLE_KEYWORDS)
 
         # 检查是否主要是描述性的
-        is_descriptive = any(keyword in step_lower for keyword in non_executable_keywords)
+        is_descriptive = any(keyword in step_lower for keyword in _NON_EXECUTABLE_KEYWORDS)
 
         # 如果包含可执行关键词且不是纯描述性的，则认为是可执行步骤
         return has_executable and not is_descriptive
@@ -688,32 +1117,8 @@ class ThinkingAgent:
         """为步骤获取默认工具推荐"""
         step_lower = step_description.lower()
 
-        # 基于步骤描述的关键词推荐工具
-        tool_recommendations = {
-            "搜索": ["web_search", "article_search_articles"],
-            "查找": ["web_search", "article_search_articles"],
-            "查询": ["web_search", "article_search_articles"],
-            "检索": ["web_search", "article_search_articles"],
-            "文献": ["pubmed_pubmed_query_page", "biorxiv_advanced_search"],
-            "论文": ["pubmed_pubmed_query_page", "biorxiv_advanced_search"],
-            "学术": ["pubmed_pubmed_query_page", "biorxiv_advanced_search"],
-            "翻译": ["translator"],
-            "计算": ["calculator"],
-            "分析": ["web_search", "article_search_articles"],
-            "获取": ["web_search", "article_search_articles"],
-            "search": ["web_search", "article_search_articles"],
-            "find": ["web_search", "article_search_articles"],
-            "query": ["web_search", "article_search_articles"],
-            "literature": ["pubmed_pubmed_query_page", "biorxiv_advanced_search"],
-            "paper": ["pubmed_pubmed_query_page", "biorxiv_advanced_search"],
-            "academic": ["pubmed_pubmed_query_page", "biorxiv_advanced_search"],
-            "translate": ["translator"],
-            "calculate": ["calculator"],
-            "analyze": ["web_search", "article_search_articles"],
-        }
-
         # 检查步骤描述中的关键词
-        for keyword, recommended_tools in tool_recommendations.items():
+        for keyword, recommended_tools in _DEFAULT_TOOL_RECOMMENDATIONS.items():
             if keyword in step_lower:
                 # 检查推荐的工具是否在可用工具中
                 available_tools = []
@@ -729,7 +1134,7 @@ class ThinkingAgent:
         default_tools = []
         for tool in self.mcp_tools:
             tool_name = getattr(tool, "name", str(tool)).lower()
-            if any(keyword in tool_name for keyword in ["search", "query", "web"]):
+            if any(keyword in tool_name for keyword in _GENERIC_SEARCH_TOOL_KEYWORDS):
                 default_tools.append(tool_name)
                 if len(default_tools) >= 2:
                     break
@@ -738,21 +1143,11 @@ class ThinkingAgent:
 
     def _is_tool_suitable_for_step(self, tool_desc: str, step_desc: str) -> bool:
         """判断工具是否适合特定步骤"""
-        # 定义工具类型和对应的关键词
-        tool_categories = {
-            "search": ["搜索", "查找", "查询", "获取信息", "了解", "search", "find", "query"],
-            "analysis": ["分析", "评估", "计算", "统计", "analyze", "calculate", "evaluate"],
-            "translation": ["翻译", "转换", "translate", "convert"],
-            "file": ["文件", "读取", "写入", "保存", "file", "read", "write", "save"],
-            "web": ["网络", "网页", "网站", "web", "url", "link"],
-            "code": ["代码", "编程", "开发", "code", "program", "develop"],
-        }
-
         tool_desc_lower = tool_desc.lower()
 
         # 确定工具类型
         tool_type = None
-        for category, keywords in tool_categories.items():
+        for category, keywords in _TOOL_CATEGORY_KEYWORDS.items():
             if any(keyword in tool_desc_lower for keyword in keywords):
                 tool_type = category
                 break
@@ -761,129 +1156,173 @@ class ThinkingAgent:
             return False
 
         # 检查步骤是否需要这种类型的工具
-        step_keywords = tool_categories.get(tool_type, [])
+        step_keywords = _TOOL_CATEGORY_KEYWORDS.get(tool_type, ())
         return any(keyword in step_desc for keyword in step_keywords)
 
     def _extract_tool_keywords(self, tool_desc: str) -> List[str]:
         """从工具描述中提取关键词"""
-        keywords = []
-
-        # 常见的功能关键词
-        common_keywords = [
-            "搜索",
-            "查询",
-            "查找",
-            "获取",
-            "读取",
-            "写入",
-            "保存",
-            "分析",
-            "计算",
-            "翻译",
-            "搜索",
-            "查询",
-            "查找",
-            "获取",
-            "读取",
-            "写入",
-            "保存",
-            "分析",
-            "计算",
-            "翻译",
-            "search",
-            "query",
-            "find",
-            "get",
-            "read",
-            "write",
-            "save",
-            "analyze",
-            "calculate",
-            "translate",
-            "学术",
-            "文献",
-            "论文",
-            "专利",
-            "网络",
-            "文件",
-            "代码",
-            "图像",
-            "图片",
-            "academic",
-            "literature",
-            "paper",
-            "patent",
-            "web",
-            "file",
-            "code",
-            "image",
-            "picture",
-        ]
-
         desc_lower = tool_desc.lower()
-        for keyword in common_keywords:
-            if keyword in desc_lower:
-                keywords.append(keyword)
+        return [keyword for keyword in _COMMON_TOOL_KEYWORDS if keyword in desc_lower]
 
-        return keywords
+    def _build_thinking_input(
+        self, user_input: str, context: Dict[str, Any] = None, conversation_history: Optional[Union[List[Dict], deque]] = None
+    ) -> List[BaseMessage]:
+        """构建完整的思考输入：固定的思考prompt作为系统消息，随请求变化的内容放在用户消息中"""
 
-    def _build_thinking_input(self, user_input: str, context: Dict[str, Any] = None, conversation_history: List[Dict] = None) -> str:
-        """构建完整的思考输入"""
+        # 上下文信息
+        context_block = f"当前上下文：\n{self._serialize_context(context)}\n\n" if context else ""
 
-        input_parts = [self.thinking_prompt]
+        # 对话历史（最近几轮，且不超过上下文和用户输入之外剩余的token额度）
+        history_block = ""
+        if conversation_history:
+            history_budget = self.input_token_budget - _estimate_tokens(context_block) - _estimate_tokens(user_input)
+            history_lines = self._fit_history(conversation_history, history_budget)
+            if history_lines:
+                history_text = "\n".join(history_lines)
+                history_block = f"对话历史：\n{history_text}\n\n"
+
+        # 用户输入，一次格式化得到完整的用户消息
+        content = f"{context_block}{history_block}用户输入：\n{user_input}\n\n请开始你的深度思考分析："
+        return [self._thinking_system_message, HumanMessage(content=content)]
+
+    def _fit_history(self, conversation_history: Union[List[Dict], deque], token_budget: int) -> List[str]:
+        """从最近的消息开始向前装入对话历史，直到超出token额度，返回按时间顺序排列的历史行"""
+        lines = list(map(_format_history_message, _recent_history(conversation_history)))
+        used = 0
+        start = len(lines)
+        while start > 0:
+            tokens = _estimate_tokens(lines[start - 1])
+            if used + tokens > token_budget:
+                break
+            used += tokens
+            start -= 1
+        if start and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("对话历史超出token额度，省略了最早的 %d 条消息", start)
+        return lines[start:]
+
+    def _serialize_context(self, context: Dict[str, Any]) -> str:
+        """序列化上下文；内容未变化的同一上下文对象直接复用上次的结果"""
+        try:
+            fingerprint = hash(frozenset(context.items()))
+        except TypeError:
+            # 含有不可哈希的嵌套值，无法低成本判断是否变化，直接序列化
+            return _dumps_indented(context)
+
+        cache = self._ctx_cache
+        key = id(context)
+        cached = cache.pop(key, None)
+        if cached is not None and cached[0] == fingerprint:
+            serialized = cached[1]
+        else:
+            serialized = _dumps_indented(context)
+            if len(cache) >= CONTEXT_CACHE_SIZE:
+                cache.pop(next(iter(cache)))
+        # 重新插入到末尾，按最近使用顺序淘汰
+        cache[key] = (fingerprint, serialized)
+        return serialized
+
+    def _think_cache_key(
+        self, user_input: str, context: Optional[Dict[str, Any]], conversation_history: Optional[Union[List[Dict], deque]]
+    ) -> Tuple[Optional[Tuple], List[str]]:
+        """生成结构化思考缓存的键；上下文和对话历史原样参与比较，槽位只来自用户输入"""
+        if self.think_cache_size <= 0:
+            return None, []
+
+        template, slots = _extract_slots(user_input)
+        context_text = self._serialize_context(context) if context else ""
+        history = (
+            tuple((msg["role"], msg["content"]) for msg in _recent_history(conversation_history))
+            if conversation_history
+            else ()
+        )
+        return (template, context_text, history), slots
 
-        # 添加上下文信息
-        if context:
-            input_parts.append(f"\n当前上下文：\n{json.dumps(context, ensure_ascii=False, indent=2)}")
+    def _get_cached_thinking(self, cache_key: Optional[Tuple], slots: List[str]) -> Optional[ThinkingResult]:
+        """查找缓存的思考结果，命中时把当前输入的槽位值填回模板"""
+        if cache_key is None:
+            return None
 
-        # 添加对话历史（最近几轮）
-        if conversation_history:
-            recent_history = conversation_history[-MAX_CONVERSATION_HISTORY:]  # 只取最近几轮
-            history_text = "\n".join(
-                [
-                    f"{msg['role']}: {msg['content'][:200]}..." if len(msg["content"]) > 200 else f"{msg['role']}: {msg['content']}"
-                    for msg in recent_history
-                ]
-            )
-            input_parts.append(f"\n对话历史：\n{history_text}")
+        template_result = self._think_cache.pop(cache_key, None)
+        if template_result is None:
+            self.stats["cache_misses"] += 1
+            return None
 
-        # 添加用户输入
-        input_parts.append(f"\n用户输入：\n{user_input}")
+        # 重新插入到末尾，按最近使用顺序淘汰
+        self._think_cache[cache_key] = template_result
+        self.stats["cache_hits"] += 1
+        return _map_result_text(template_result, lambda text: _SLOT_MARK_RE.sub(lambda m: slots[int(m.group(1))], text))
+
+    def _store_cached_thinking(self, cache_key: Optional[Tuple], slots: List[str], result: ThinkingResult):
+        """
+        把思考结果中出现的槽位值替换为槽位标记后缓存
+
+        只有每个槽位值都在词边界处被完整替换、且替换后不再残留槽位值或其片段（如路径的文件名、
+        去掉协议的URL）时才缓存，否则模板中会留下本次请求的实体，泄漏到其他输入的结果中
+        """
+        if cache_key is None:
+            return
 
-        input_parts.append("\n请开始你的深度思考分析：")
+        # 较长的值优先替换，避免短值替换掉长值的一部分
+        ordered = sorted(enumerate(slots), key=lambda item: len(item[1]), reverse=True)
+        patterns = [(index, _slot_pattern(value)) for index, value in ordered]
+        residue_patterns = [_slot_pattern(fragment) for value in slots for fragment in {value, *_slot_fragments(value)}]
+        replaced = set()
+        residual = False
+
+        def _to_marks(text: str) -> str:
+            nonlocal residual
+            for index, pattern in patterns:
+                text, count = pattern.subn(_SLOT_MARK.format(index), text)
+                if count:
+                    replaced.add(index)
+            if not residual and any(pattern.search(text) for pattern in residue_patterns):
+                residual = True
+            return text
+
+        template_result = _map_result_text(result, _to_marks)
+        if residual or len(replaced) < len(slots):
+            logger.debug("思考结果中的槽位值无法完整替换，不缓存")
+            return
 
-        return "\n".join(input_parts)
+        cache = self._think_cache
+        if len(cache) >= self.think_cache_size:
+            cache.pop(next(iter(cache)))
+        cache[cache_key] = template_result
 
     def _parse_thinking_response(self, response: str) -> ThinkingResult:
         """解析LLM的思考响应"""
+        return self._parse_thinking_response_checked(response)[0]
+
+    def _parse_thinking_response_checked(self, response: str) -> Tuple[ThinkingResult, bool]:
+        """解析LLM的思考响应，同时返回是否解析成功（False表示使用了回退结果）"""
         try:
             # 新的解析方法：从自然语言格式中提取结构化信息
-            result = self._parse_natural_thinking_response(response)
-            return result
+            return self._parse_natural_thinking_response(response), True
 
         except Exception as e:
             logger.warning(f"解析思考结果失败: {str(e)}，使用原始响应")
-            return self._parse_fallback_response(response)
+            return self._parse_fallback_response(response), False
 
     def _parse_natural_thinking_response(self, response: str) -> ThinkingResult:
         """解析自然语言格式的思考响应"""
+        sections = self._index_sections(response)
 
         # 提取用户意图
-        user_intent = self._extract_section_content(response, "用户意图分析")
+        user_intent = self._extract_section_content(sections, "用户意图分析")
 
         # 提取问题分析
-        problem_analysis = self._extract_section_content(response, "问题背景理解")
+        problem_analysis = self._extract_section_content(sections, "问题背景理解")
 
         # 提取执行计划
-        execution_plan_text = self._extract_section_content(response, "执行计划制定")
+        execution_plan_text = self._extract_section_content(sections, "执行计划制定")
         execution_plan = self._parse_execution_plan(execution_plan_text)
 
         # 提取复杂度评估
-        complexity_text = self._extract_section_content(response, "复杂度评估")
+        complexity_text = self._extract_section_content(sections, "复杂度评估")
         estimated_complexity = self._extract_complexity(complexity_text)
 
         # 提取建议模型
-        suggested_model = self._extract_section_content(response, "建议模型")
+        suggested_model = self._extract_section_content(sections, "建议模型")
 
         # 构建ThinkingResult对象
         result = ThinkingResult(
@@ -898,26 +1337,21 @@ class ThinkingAgent:
 
         return result
 
-    def _extract_section_content(self, text: str, section_name: str) -> str:
+    def _index_sections(self, text: str) -> Dict[str, str]:
+        """一次扫描建立 章节名 -> 原始内容 的索引，同名章节以首次出现为准"""
+        sections: Dict[str, str] = {}
+        matches = list(_SECTION_RE.finditer(text))
+        for match, next_match in zip(matches, matches[1:] + [None]):
+            sections.setdefault(match.group(1), text[match.end() : next_match.start() if next_match else len(text)])
+        return sections
+
+    def _extract_section_content(self, sections: Dict[str, str], section_name: str) -> str:
         """提取指定章节的内容"""
         try:
-            # 查找章节开始
-            start_marker = f"**{section_name}**"
-            start_idx = text.find(start_marker)
-            if start_idx == -1:
+            content = sections.get(section_name)
+            if content is None:
                 return ""
 
-            # 查找下一个章节或文档结束
-            content_start = start_idx + len(start_marker)
-            next_section_start = text.find("**", content_start)
-
-            if next_section_start == -1:
-                # 没有下一个章节，取到文档结束
-                content = text[content_start:].strip()
-            else:
-                # 取到下一个章节开始
-                content = text[content_start:next_section_start].strip()
-
             # 只做基本的清理，保留AI的自然语言输出
             content = content.strip()
 
@@ -934,7 +1368,7 @@ class ThinkingAgent:
             return content.strip()
 
         except Exception as e:
-            logger.debug(f"提取章节 {section_name} 失败: {str(e)}")
+            logger.debug("提取章节 %s 失败: %s", section_name, e)
             return ""
 
     def _parse_execution_plan(self, plan_text: str) -> List[ThinkingStep]:
@@ -944,70 +1378,62 @@ class ThinkingAgent:
             logger.debug("执行计划文本为空")
             return steps
 
+        # 逐行的debug日志仅在DEBUG级别开启时才格式化
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+
         try:
-            logger.debug(f"开始解析执行计划: {plan_text[:200]}...")
+            if debug_enabled:
+                logger.debug(f"开始解析执行计划: {plan_text[:200]}...")
 
-            # 按行分割
-            lines = plan_text.split("\n")
             current_step = None
+            # 当前步骤的描述片段，新步骤开始或解析结束时一次性拼接
+            description_parts: List[str] = []
 
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
+            # 逐个匹配去除首尾空白后的非空行，不生成中间的行列表
+            for line_match in _PLAN_LINE_RE.finditer(plan_text):
+                line = line_match.group(1)
 
-                logger.debug(f"处理行: {line}")
+                if debug_enabled:
+                    logger.debug(f"处理行: {line}")
 
-                # 多种步骤识别模式
-                step_created = False
+                # 多种步骤识别模式，一次匹配确定行首类型
+                step_match = _PLAN_STEP_RE.match(line)
+                kind = step_match.lastgroup if step_match else None
 
                 # 模式1: 数字. 描述
-                if line[0].isdigit() and "." in line:
-                    step_created = self._create_step_from_line(line, steps, current_step)
-                    if step_created:
-                        current_step = step_created
-
+                if kind == "num" and "." in line:
+                    step_line = line
                 # 模式2: 数字、描述
-                elif line[0].isdigit() and "、" in line:
-                    step_created = self._create_step_from_line(line.replace("、", "."), steps, current_step)
-                    if step_created:
-                        current_step = step_created
-
-                # 模式3: - 描述
-                elif line.startswith("- "):
-                    step_created = self._create_step_from_line(f"{len(steps)+1}. {line[2:]}", steps, current_step)
-                    if step_created:
-                        current_step = step_created
-
-                # 模式4: • 描述
-                elif line.startswith("• "):
-                    step_created = self._create_step_from_line(f"{len(steps)+1}. {line[2:]}", steps, current_step)
-                    if step_created:
-                        current_step = step_created
-
+                elif kind == "num" and "、" in line:
+                    step_line = line.replace("、", ".")
+                # 模式3/4: - 描述 / • 描述
+                elif kind == "bullet":
+                    step_line = f"{len(steps)+1}. {line[2:]}"
                 # 模式5: 第一步、第二步等
-                elif any(line.startswith(marker) for marker in ["第一步", "第二步", "第三步", "第四步", "第五步"]):
-                    step_created = self._create_step_from_line(f"{len(steps)+1}. {line}", steps, current_step)
-                    if step_created:
-                        current_step = step_created
+                elif kind == "ordinal":
+                    step_line = f"{len(steps)+1}. {line}"
+                else:
+                    step_line = None
+
+                if step_line is not None:
+                    # 上一个步骤会在_create_step_from_line中加入steps，先合并它的描述片段
+                    if len(description_parts) > 1:
+                        current_step.description = " ".join(description_parts)
+                    current_step = self._create_step_from_line(step_line, steps, current_step)
+                    description_parts = [current_step.description]
 
                 # 如果不是新步骤，添加到当前步骤的描述中
-                elif current_step and line and not step_created:
-                    # 使用列表收集描述片段，最后一次性拼接
-                    if not hasattr(current_step, "_description_parts"):
-                        current_step._description_parts = [current_step.description]
-                    current_step._description_parts.append(line)
+                elif current_step:
+                    description_parts.append(line)
 
             # 添加最后一个步骤
             if current_step:
-                # 如果有收集的描述片段，合并它们
-                if hasattr(current_step, "_description_parts"):
-                    current_step.description = " ".join(current_step._description_parts)
-                    delattr(current_step, "_description_parts")
+                if len(description_parts) > 1:
+                    current_step.description = " ".join(description_parts)
                 steps.append(current_step)
 
         except Exception as e:
-            logger.debug(f"解析执行计划失败: {str(e)}")
+            logger.debug("解析执行计划失败: %s", e)
 
         # 如果没有解析到步骤，尝试从整个文本中提取
         if not steps:
@@ -1031,7 +1457,7 @@ class ThinkingAgent:
             if not step.expected_tools:
                 step.expected_tools = self._extract_tools_for_step(step.description)
 
-        logger.debug(f"解析完成，共找到 {len(steps)} 个步骤")
+        logger.debug("解析完成，共找到 %d 个步骤", len(steps))
         return steps
 
     def _create_step_from_line(self, line: str, steps: List[ThinkingStep], current_step: ThinkingStep = None) -> ThinkingStep:
@@ -1063,7 +1489,8 @@ class ThinkingAgent:
             dependencies=[],
         )
 
-        logger.debug(f"创建步骤: {step_desc}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"创建步骤: {step_desc}")
         return new_step
 
     def _extract_steps_from_text(self, text: str) -> List[ThinkingStep]:
@@ -1094,14 +1521,7 @@ class ThinkingAgent:
         if not complexity_text:
             return "medium"
 
-        complexity_text = complexity_text.lower()
-
-        if any(word in complexity_text for word in ["简单", "low", "easy"]):
-            return "low"
-        elif any(word in complexity_text for word in ["复杂", "high", "difficult"]):
-            return "high"
-        else:
-            return "medium"
+        return _classify_complexity(complexity_text, _EXTRACT_COMPLEXITY_RE)
 
     def _parse_fallback_response(self, response: str) -> ThinkingResult:
         """备用解析方法，当JSON解析失败时使用"""
@@ -1120,6 +1540,26 @@ class ThinkingAgent:
             timestamp=datetime.now(),
         )
 
+    def _create_direct_result(self, user_input: str) -> ThinkingResult:
+        """为无需深度思考的简单输入创建思考结果"""
+        steps = [
+            ThinkingStep(
+                step_id="step_1",
+                description=f"直接回复用户: {user_input[:100]}",
+                reasoning="简单的问候或指令，无需工具和深度分析",
+                expected_tools=[],
+                parameters={},
+            )
+        ]
+
+        return ThinkingResult(
+            user_intent=user_input[:200],
+            problem_analysis="简单输入，直接回复",
+            execution_plan=steps,
+            estimated_complexity="low",
+            timestamp=datetime.now(),
+        )
+
     def _create_fallback_result(self, user_input: str) -> ThinkingResult:
         """创建备用的思考结果"""
         steps = [
@@ -1152,14 +1592,60 @@ class ThinkingAgent:
             ThinkingResult: 优化后的执行计划
         """
         try:
-            refine_prompt = f"""
+            response = await self.llm.ainvoke(self._build_refine_prompt(current_plan, feedback))
+            refined_result = await asyncio.to_thread(self._parse_thinking_response, response.content)
+
+            logger.info("ThinkingAgent已根据反馈优化执行计划")
+            return refined_result
+
+        except Exception as e:
+            logger.error(f"计划优化失败: {str(e)}")
+            return current_plan  # 返回原计划
+
+    async def refine_plans_parallel(
+        self, current_plan: ThinkingResult, feedbacks: List[str], max_concurrency: int = 4
+    ) -> List[ThinkingResult]:
+        """
+        根据多条反馈并发生成多个优化后的执行计划
+
+        Args:
+            current_plan: 当前执行计划
+            feedbacks: 反馈列表，每条反馈生成一个候选计划
+            max_concurrency: 同时进行的LLM请求数上限
+
+        Returns:
+            List[ThinkingResult]: 与feedbacks顺序一致的优化结果，失败的项返回原计划
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # 所有反馈共用同一计划，只序列化一次
+        refine_prefix = self._build_refine_prefix(current_plan)
+
+        async def _refine(feedback: str) -> ThinkingResult:
+            async with semaphore:
+                response = await self.llm.ainvoke(self._build_refine_prompt(current_plan, feedback, refine_prefix))
+            # 解析在工作线程中进行，不占用并发名额
+            return await asyncio.to_thread(self._parse_thinking_response, response.content)
+
+        refined = await asyncio.gather(*[_refine(feedback) for feedback in feedbacks], return_exceptions=True)
+
+        results = []
+        for result in refined:
+            if isinstance(result, BaseException):
+                logger.error(f"计划优化失败: {str(result)}")
+                results.append(current_plan)
+            else:
+                results.append(result)
+
+        logger.info(f"ThinkingAgent已根据{len(feedbacks)}条反馈并发优化执行计划")
+        return results
+
+    def _build_refine_prefix(self, current_plan: ThinkingResult) -> str:
+        """构建计划优化prompt的固定前缀（当前计划和优化要求），同一计划的多条反馈共用"""
+        return f"""
 基于以下执行计划和反馈，请优化和调整计划：
 
 当前计划：
-{json.dumps(current_plan.__dict__, ensure_ascii=False, default=str, indent=2)}
-
-反馈信息：
-{feedback}
+{_dumps_indented(current_plan.to_dict(), default=str)}
 
 请提供优化后的执行计划，格式与之前相同的JSON格式。
 重点关注：
@@ -1167,19 +1653,33 @@ class ThinkingAgent:
 2. 优化工具选择
 3. 改进参数配置
 4. 调整步骤顺序
-
-优化后的计划：
 """
 
-            response = await self.llm.ainvoke(refine_prompt)
-            refined_result = self._parse_thinking_response(response.content)
+    def _build_refine_prompt(self, current_plan: ThinkingResult, feedback: str, refine_prefix: Optional[str] = None) -> List[BaseMessage]:
+        """
+        构建计划优化的prompt：计划和要求在前，随请求变化的反馈在后，便于LLM服务端复用前缀缓存
 
-            logger.info("ThinkingAgent已根据反馈优化执行计划")
-            return refined_result
+        Args:
+            current_plan: 当前执行计划
+            feedback: 反馈信息
+            refine_prefix: 预先构建的固定前缀，为空时根据current_plan构建
+        """
+        if refine_prefix is None:
+            refine_prefix = self._build_refine_prefix(current_plan)
+        feedback_text = f"""
+反馈信息：
+{feedback}
 
-        except Exception as e:
-            logger.error(f"计划优化失败: {str(e)}")
-            return current_plan  # 返回原计划
+优化后的计划：
+"""
+        # Anthropic需要显式标记缓存断点，其他提供商自动缓存相同前缀
+        if isinstance(self.llm, ChatAnthropic):
+            content = [
+                {"type": "text", "text": refine_prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": feedback_text},
+            ]
+            return [HumanMessage(content=content)]
+        return [HumanMessage(content=refine_prefix + feedback_text)]
 
     def get_thinking_stats(self) -> Dict[str, Any]:
         """获取思考Agent的统计信息"""
@@ -1192,31 +1692,31 @@ class ThinkingAgent:
             "mcp_tools_count": len(self.mcp_tools),
         }
 
-    def _clean_thinking_chunk(self, chunk: str) -> str:
-        """清理思考分块内容，移除markdown标记等"""
-        if not chunk:
-            return ""
-
-        # 移除markdown标记
-        chunk = chunk.replace("###", "").replace("##", "").replace("#", "")
-        chunk = chunk.replace("**", "").replace("*", "")
-        chunk = chunk.replace("```", "").replace("`", "")
-
-        # 移除多余的空白字符
-        lines = [line.strip() for line in chunk.split("\n") if line.strip()]
-        chunk = "\n".join(lines)
-
-        return chunk.strip()
+    def _create_structured_data(
+        self,
+        full_response: str,
+        user_input: str,
+        cleaned_response: Optional[str] = None,
+        complexity_level: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        创建结构化的思考结果数据
 
-    def _create_structured_result(self, full_response: str, user_input: str) -> str:
-        """创建结构化的思考结果 - JSON格式"""
+        Args:
+            full_response: 完整的思考内容
+            user_input: 用户输入
+            cleaned_response: 已清理的思考内容（流式过程中增量得到），为空时从full_response计算
+            complexity_level: 已评估的复杂度（low/medium/high），为空时从清理后的内容计算
+        """
 
         # 清理和格式化思考内容
-        cleaned_response = self._clean_summary_content(full_response)
+        if cleaned_response is None:
+            cleaned_response = self._clean_summary_content(full_response)
 
         # 提取关键信息
         key_points = self._extract_key_points(cleaned_response)
-        complexity = self._assess_complexity(cleaned_response)
+        if complexity_level is None:
+            complexity_level = _classify_complexity(cleaned_response, _ASSESS_COMPLEXITY_RE)
 
         # 创建执行计划（支持多条，但只包含可执行的步骤）
         execution_plan = self._create_execution_plan_from_content(cleaned_response)
@@ -1235,12 +1735,12 @@ class ThinkingAgent:
         structured_data = {
             "status": "completed",
             "user_input": user_input,
-            "user_intent": user_input[:200] + "..." if len(user_input) > 200 else user_input,
-            "problem_analysis": cleaned_response[:800] + "..." if len(cleaned_response) > 800 else cleaned_response,
+            "user_intent": _ellipsize(user_input, MAX_USER_INPUT_LENGTH),
+            "problem_analysis": _ellipsize(cleaned_response, MAX_PROBLEM_ANALYSIS_LENGTH),
             "key_points": key_points,
             "execution_plan": execution_plan,  # 使用优化后的执行计划
-            "estimated_complexity": complexity.replace("🟢 **复杂度**: ", "").replace("🟡 **复杂度**: ", "").replace("🔴 **复杂度**: ", ""),
-            "complexity_level": "low" if "🟢" in complexity else "high" if "🔴" in complexity else "medium",
+            "estimated_complexity": complexity_level,
+            "complexity_level": complexity_level,
             "suggested_model": None,
             "context_requirements": {},
             "suggested_tools": suggested_tools,  # 只返回执行计划中需要的工具
@@ -1255,4 +1755,4 @@ class ThinkingAgent:
                 "executable_steps": len([plan for plan in execution_plan if plan.get("expected_tools")]),
             },
         }
-        return json.dumps(structured_data, ensure_ascii=False, indent=2)
+        return structured_data
@@ -26,6 +26,12 @@ async def lifespan(app: FastAPI):
         await init_redis()
         logger.info("Redis connection pool initialized successfully")
 
+        # 启动会话管理器
+        from copilot.core.session_manager import session_manager
+
+        await session_manager.start()
+        logger.info("Session manager started")
+
         # 启动MCP管理器
         await mcp_server_manager.start()
         logger.info("MCP server manager started")
@@ -60,6 +66,12 @@ async def lifespan(app: FastAPI):
         await mongo_manager.close()
         logger.info("MongoDB connections closed")
 
+        # 停止会话管理器（在关闭Redis前写回缓冲的最后活动时间）
+        from copilot.core.session_manager import session_manager
+
+        await session_manager.stop()
+        logger.info("Session manager stopped")
+
         await close_redis()
         logger.info("Redis connections closed")
 
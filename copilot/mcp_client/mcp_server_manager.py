@@ -28,6 +28,9 @@ class MCPServerManager:
         # tool_full_name 格式: "server_id::tool_name"
         self.tools_index: Dict[str, Dict[str, Any]] = {}
 
+        # 服务器注册变更计数：每次注册、注销（含重启时的重新注册）递增，供工具缓存判断是否失效
+        self.generation = 0
+
     async def start(self):
         """启动MCP服务器管理器"""
         logger.info("MCPServerManager started")
@@ -91,6 +94,7 @@ class MCPServerManager:
 
             # 更新全局工具索引
             self._update_tools_index(server_id, tools, server_config)
+            self.generation += 1
 
             logger.info(f"Successfully registered server {server_id} with {len(tools)} tools")
             return True
@@ -114,6 +118,7 @@ class MCPServerManager:
 
             # 清理服务器
             del self.servers[server_id]
+            self.generation += 1
 
             logger.info(f"Unregistered server: {server_id}")
             return True
@@ -34,6 +34,9 @@ stats_service = StatsService()
 # FastAPI应用
 router = APIRouter(prefix="/chat")
 
+# 流式输出时遇到这些字符（标点、换行、空格）立即刷新缓冲
+_FLUSH_CHARS = frozenset("，。！？；：\n ")
+
 
 async def get_chat_service():
     """获取聊天服务实例，如果未初始化则先初始化"""
@@ -218,7 +221,7 @@ async def _generate_stream_response(request: ChatRequest):
                     ai_response_started = True
 
                 # 优化缓冲策略：更频繁的刷新以获得更好的实时体验
-                if len(content_buffer) >= 3 or any(char in content_buffer for char in "，。！？；：\n ") or content_buffer.endswith(" "):
+                if len(content_buffer) >= 3 or not _FLUSH_CHARS.isdisjoint(content_buffer):
                     # 🎯 控制台输出：实时流式输出AI回复内容
                     print(content_buffer, end="", flush=True)
 
@@ -233,8 +236,7 @@ async def _generate_stream_response(request: ChatRequest):
                     # 检查并发送StreamNotifier的待发送消息
                     from copilot.core.stream_notifier import StreamNotifier
 
-                    pending_messages = StreamNotifier.get_pending_messages(request.session_id)
-                    for message in pending_messages:
+                    for message in StreamNotifier.iter_pending_messages(request.session_id):
                         try:
                             stream_data = message.to_json_string() + "\n"
                             yield stream_data.encode("utf-8")
@@ -275,8 +277,7 @@ async def _generate_stream_response(request: ChatRequest):
         # 检查并发送最后的StreamNotifier消息
         from copilot.core.stream_notifier import StreamNotifier
 
-        pending_messages = StreamNotifier.get_pending_messages(request.session_id)
-        for message in pending_messages:
+        for message in StreamNotifier.iter_pending_messages(request.session_id):
             try:
                 stream_data = message.to_json_string() + "\n"
                 yield stream_data.encode("utf-8")
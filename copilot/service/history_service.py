@@ -349,13 +349,14 @@ class ChatHistoryManager:
                     
                     async with get_redis() as redis:
                         session_key = f"{session_manager.redis_prefix}{session_id}"
-                        await redis.delete(session_key)
+                        await redis.delete(session_key, session_manager._context_key(session_id))
                         
                         # 从用户会话列表中移除
                         session_doc = await sessions_collection.find_one({"session_id": session_id})
                         if session_doc:
                             user_sessions_key = f"{session_manager.user_sessions_prefix}{session_doc['user_id']}"
                             await redis.srem(user_sessions_key, session_id)
+                        await redis.hdel(session_manager.session_owner_key, session_id)
                     
                     logger.info(f"Soft deleted session {session_id}")
                 else:
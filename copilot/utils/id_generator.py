@@ -0,0 +1,29 @@
+"""
+ID生成工具
+生成按时间排序的UUIDv7格式ID，用于会话ID和请求ID
+"""
+
+import os
+import time
+
+# UUIDv7: 48位毫秒时间戳 | 4位版本号 | 12位随机数 | 2位变体 | 62位随机数
+_VERSION_BITS = 0x7 << 76
+_VARIANT_BITS = 0x2 << 62
+_RAND_A_MASK = 0xFFF << 64
+_RAND_B_MASK = (1 << 62) - 1
+
+
+def generate_id() -> str:
+    """
+    生成按创建时间排序的ID
+
+    与uuid4格式兼容（8-4-4-4-12的十六进制字符串），但前缀为毫秒时间戳，
+    生成的键按时间有序，便于索引和按时间扫描；直接拼接字符串，不构造UUID对象
+
+    Returns:
+        str: UUIDv7格式的ID
+    """
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (time.time_ns() // 1_000_000) << 80 | _VERSION_BITS | (rand << 2) & _RAND_A_MASK | _VARIANT_BITS | rand & _RAND_B_MASK
+    h = f"{value:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
@@ -180,6 +180,25 @@ class RedisClient:
         client = self._ensure_initialized()
         return await client.sismember(key, value)
 
+    # === 哈希操作 ===
+    @redis_error_handler
+    async def hget(self, key: str, field: str) -> Optional[str]:
+        """获取哈希字段的值"""
+        client = self._ensure_initialized()
+        return await client.hget(key, field)
+
+    @redis_error_handler
+    async def hdel(self, key: str, *fields: str) -> int:
+        """删除哈希字段"""
+        client = self._ensure_initialized()
+        return await client.hdel(key, *fields)
+
+    @redis_error_handler
+    async def hgetall(self, key: str) -> dict:
+        """获取哈希的所有字段"""
+        client = self._ensure_initialized()
+        return await client.hgetall(key)
+
     # === 高级操作 ===
     @redis_error_handler
     async def keys(self, pattern: str = "*") -> list:
@@ -199,6 +218,12 @@ class RedisClient:
         async for key in client.scan_iter(match=match, count=count):
             yield key
 
+    async def hscan_iter(self, name: str, match: Optional[str] = None, count: int = 100) -> AsyncGenerator[tuple, None]:
+        """异步迭代扫描哈希字段，返回(字段, 值)"""
+        client = self._ensure_initialized()
+        async for item in client.hscan_iter(name, match=match, count=count):
+            yield item
+
     # === 上下文管理器 ===
     async def __aenter__(self) -> "RedisClient":
         await self.initialize()
@@ -262,6 +287,22 @@ class RedisClient:
             results = await pipe.execute()
             return results[0]
 
+    @redis_error_handler
+    async def config_get(self, pattern: str) -> dict:
+        """获取服务端配置"""
+        client = self._ensure_initialized()
+        return await client.config_get(pattern)
+
+    def pipeline(self, transaction: bool = False):
+        """创建管道，批量发送命令以减少网络往返"""
+        client = self._ensure_initialized()
+        return client.pipeline(transaction=transaction)
+
+    def register_script(self, script: str):
+        """注册Lua脚本，返回的脚本对象通过EVALSHA执行，服务端缺失时自动重新加载"""
+        client = self._ensure_initialized()
+        return client.register_script(script)
+
     # === 发布订阅操作 ===
     @redis_error_handler
     async def publish(self, channel: str, message: Union[str, bytes]) -> int:
@@ -0,0 +1,34 @@
+"""
+Redis会话迁移脚本
+将旧版本以JSON字符串存储的会话（agent_session:*）迁移为哈希格式
+"""
+
+import asyncio
+
+from copilot.core.session_manager import session_manager
+from copilot.utils.logger import logger
+from copilot.utils.redis_client import close_redis, init_redis
+
+
+async def main():
+    """主函数"""
+    logger.info("🚀 Starting Redis session migration...")
+
+    try:
+        await init_redis()
+        migrated = await session_manager.migrate_legacy_sessions()
+        logger.info(f"🎉 Migrated {migrated} legacy sessions!")
+
+    except Exception as e:
+        logger.error(f"💥 Redis session migration failed: {str(e)}")
+        return 1
+
+    finally:
+        await close_redis()
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main())
+    exit(exit_code)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试MCP工具包装器的已包装工具缓存
+"""
+
+import asyncio
+from unittest.mock import patch
+
+from copilot.core import mcp_tool_wrapper
+from copilot.core.mcp_tool_wrapper import MCPToolWrapper
+from copilot.mcp_client.mcp_server_manager import MCPServerManager
+
+
+class _FakeClient:
+    """记录get_tools调用次数的假MultiServerMCPClient"""
+
+    calls = 0
+
+    def __init__(self, config):
+        self.config = config
+
+    async def get_tools(self):
+        _FakeClient.calls += 1
+        return []
+
+
+def _register(manager: MCPServerManager, server_id: str, **config):
+    manager.servers[server_id] = {"client": None, "config": {"id": server_id, "name": server_id, **config}, "tools": {"t": {}}}
+    manager.generation += 1
+
+
+def _load_tools(manager: MCPServerManager):
+    with patch.object(mcp_tool_wrapper, "mcp_server_manager", manager), patch.object(
+        mcp_tool_wrapper, "MultiServerMCPClient", _FakeClient
+    ):
+        return asyncio.run(MCPToolWrapper.get_mcp_tools())
+
+
+def test_catalog_cache_invalidated_by_config_and_restart():
+    """env等连接配置变化或服务器重新注册后不再使用旧缓存"""
+    MCPToolWrapper._catalog_cache.clear()
+    _FakeClient.calls = 0
+    manager = MCPServerManager()
+    _register(manager, "s1", command="python", args=["a.py"], env={"TOKEN": "1"})
+
+    _load_tools(manager)
+    _load_tools(manager)
+    assert _FakeClient.calls == 1
+
+    manager.servers["s1"]["config"]["env"] = {"TOKEN": "2"}
+    _load_tools(manager)
+    assert _FakeClient.calls == 2
+
+    # 重启：注销后以相同配置重新注册
+    config = manager.servers.pop("s1")["config"]
+    manager.generation += 1
+    _register(manager, "s1", **{k: v for k, v in config.items() if k not in ("id", "name")})
+    _load_tools(manager)
+    assert _FakeClient.calls == 3
+
+
+def test_catalog_cache_expires_after_ttl():
+    """缓存超过有效期后重新加载工具"""
+    MCPToolWrapper._catalog_cache.clear()
+    _FakeClient.calls = 0
+    manager = MCPServerManager()
+    _register(manager, "s1", url="http://localhost:9000/mcp")
+
+    _load_tools(manager)
+    with patch.object(mcp_tool_wrapper, "CATALOG_CACHE_TTL", 0):
+        _load_tools(manager)
+    assert _FakeClient.calls == 2
+
+
+if __name__ == "__main__":
+    test_catalog_cache_invalidated_by_config_and_restart()
+    test_catalog_cache_expires_after_ttl()
+    print("✅ 测试完成")
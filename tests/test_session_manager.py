@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+测试会话管理器的Redis存储、缓存和后台任务
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import fakeredis
+
+from copilot.core import session_manager as session_manager_module
+from copilot.core.session_manager import SessionInfo, SessionManager
+
+
+def _fake_redis():
+    """每个测试独立的进程内假Redis；fakeredis在RESP3下不会解码哈希的返回值，固定使用RESP2"""
+    return fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True, protocol=2)
+
+
+def _patch_redis(redis):
+    """让会话管理器使用给定的Redis客户端"""
+
+    @asynccontextmanager
+    async def fake_get_redis():
+        yield redis
+
+    return patch.object(session_manager_module, "get_redis", fake_get_redis)
+
+
+def test_start_falls_back_to_cleanup_without_expired_events():
+    """Redis未开启过期事件（或禁用CONFIG命令）时不修改服务端配置，改为定期清理"""
+    redis = _fake_redis()
+    manager = SessionManager()
+
+    async def run():
+        with _patch_redis(redis):
+            await manager.start()
+            started = (manager.expired_listener_task, manager.cleanup_task)
+            await manager.stop()
+        return started
+
+    listener_task, cleanup_task = asyncio.run(run())
+    assert listener_task is None
+    assert cleanup_task is not None
+
+
+def test_start_listens_for_expired_events_when_enabled():
+    """Redis已开启Ex通知时订阅过期事件，同时保留低频的对账清理"""
+    redis = _fake_redis()
+    manager = SessionManager()
+
+    async def config_get(pattern):
+        return {"notify-keyspace-events": "Ex"}
+
+    async def listen():
+        await asyncio.Event().wait()
+
+    async def run():
+        with _patch_redis(redis), patch.object(redis, "config_get", config_get, create=True), patch.object(
+            manager, "_listen_expired_sessions", listen
+        ):
+            await manager.start()
+            started = (manager.expired_listener_task, manager.cleanup_task)
+            await manager.stop()
+        return started
+
+    listener_task, cleanup_task = asyncio.run(run())
+    assert listener_task is not None
+    assert cleanup_task is not None
+
+
+def _legacy_session(session_id: str) -> str:
+    return json.dumps(
+        {
+            "session_id": session_id,
+            "user_id": "u1",
+            "window_id": "w1",
+            "created_at": "2025-01-01T00:00:00",
+            "last_activity": "2025-01-01T00:00:00",
+            "context": {"lang": "zh"},
+            "thread_id": f"u1_{session_id}",
+        }
+    )
+
+
+def test_get_session_migrates_legacy_string_session():
+    """旧版本JSON字符串格式的会话读取时迁移为哈希格式，上下文保留"""
+    redis = _fake_redis()
+    manager = SessionManager()
+
+    async def run():
+        await redis.set("agent_session:s1", _legacy_session("s1"), ex=3600)
+        with _patch_redis(redis):
+            session = await manager.get_session("s1")
+            context = await manager.get_session_context("s1")
+        return session, context
+
+    session, context = asyncio.run(run())
+    assert session.user_id == "u1"
+    assert context == {"lang": "zh"}
+
+    async def check():
+        return await redis.exists("agent_session:s1"), await redis.hget("agent_session_hash:s1", "thread_id")
+
+    legacy_exists, thread_id = asyncio.run(check())
+    assert legacy_exists == 0
+    assert thread_id == "u1_s1"
+
+
+def test_migrate_legacy_sessions():
+    """一次性迁移所有旧格式会话"""
+    redis = _fake_redis()
+    manager = SessionManager()
+
+    async def run():
+        for session_id in ("s1", "s2"):
+            await redis.set(f"agent_session:{session_id}", _legacy_session(session_id), ex=3600)
+        with _patch_redis(redis):
+            migrated = await manager.migrate_legacy_sessions()
+        return migrated, sorted(await redis.smembers("user_sessions:u1"))
+
+    migrated, user_sessions = asyncio.run(run())
+    assert migrated == 2
+    assert user_sessions == ["s1", "s2"]
+
+
+def test_local_cache_returns_independent_copies():
+    """进程内缓存命中时每个调用方得到独立的副本，互不影响"""
+    redis = _fake_redis()
+    manager = SessionManager()
+
+    async def run():
+        with _patch_redis(redis):
+            await redis.set("agent_session:s1", _legacy_session("s1"), ex=3600)
+            await manager.get_session("s1")
+            first = await manager.get_session("s1")
+            first.window_id = "changed"
+            second = await manager.get_session("s1")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is not second
+    assert second.window_id == "w1"
+
+
+def test_touch_flushes_immediately_without_background_task():
+    """未调用start时读取会话立即写回最后活动时间并续期，不在缓冲中堆积"""
+    redis = _fake_redis()
+    manager = SessionManager()
+
+    async def run():
+        with _patch_redis(redis):
+            await redis.set("agent_session:s1", _legacy_session("s1"), ex=3600)
+            await manager.get_session("s1")
+            await redis.expire("agent_session_hash:s1", 10)
+            session = await manager.get_session("s1")
+            return session, await redis.hget("agent_session_hash:s1", "last_activity"), await redis.ttl("agent_session_hash:s1")
+
+    session, last_activity, ttl = asyncio.run(run())
+    assert not manager._pending_touches
+    assert last_activity == session.last_activity.isoformat()
+    assert ttl > 10
+
+
+def test_write_and_touch_scripts_round_trip():
+    """写入脚本保存元数据、上下文和用户会话列表；刷新脚本更新最后活动时间并续期，会话不存在时不写入"""
+    redis = _fake_redis()
+    manager = SessionManager(session_timeout=100)
+    created = datetime(2025, 1, 1, 8, 30)
+    session_info = SessionInfo(
+        session_id="s1", user_id="u1", window_id="w1", created_at=created, last_activity=created, context={"k": [1, 2]}, thread_id="u1_s1"
+    )
+    touched_at = created + timedelta(minutes=5)
+
+    async def run():
+        with _patch_redis(redis):
+            await manager._write_session(redis, session_info)
+            stored = manager._deserialize_session(await redis.hgetall("agent_session_hash:s1"))
+            context = await manager.get_session_context("s1")
+            user_sessions = await redis.smembers("user_sessions:u1")
+            owner = await redis.hget("agent_session_owner", "s1")
+
+            await redis.expire("agent_session_hash:s1", 10)
+            await redis.expire("agent_session_hash:s1:ctx", 10)
+            manager._pending_touches = {"s1": touched_at, "gone": touched_at}
+            await manager.flush_touches()
+            touched = await redis.hget("agent_session_hash:s1", "last_activity")
+            ttls = (await redis.ttl("agent_session_hash:s1"), await redis.ttl("agent_session_hash:s1:ctx"))
+            gone_exists = await redis.exists("agent_session_hash:gone")
+        return stored, context, user_sessions, owner, touched, ttls, gone_exists
+
+    stored, context, user_sessions, owner, touched, ttls, gone_exists = asyncio.run(run())
+    assert stored.created_at == created
+    assert stored.thread_id == "u1_s1"
+    assert stored.context is None
+    assert context == {"k": [1, 2]}
+    assert user_sessions == {"s1"}
+    assert owner == "u1"
+    assert touched == touched_at.isoformat()
+    assert all(ttl > 10 for ttl in ttls)
+    assert gone_exists == 0
+
+
+class _FakeMongo:
+    """记录查询次数、始终查不到文档的假MongoClient"""
+
+    queries = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return None
+
+    async def find_one(self, collection, query):
+        _FakeMongo.queries += 1
+        return None
+
+
+def test_missing_session_negative_cache_expires():
+    """数据库中不存在的会话在有效期内不重复查询数据库，过期后重新查询"""
+    redis = _fake_redis()
+    manager = SessionManager()
+    _FakeMongo.queries = 0
+
+    async def run():
+        with _patch_redis(redis), patch("copilot.utils.mongo_client.MongoClient", _FakeMongo):
+            assert await manager.get_session("missing") is None
+            assert await manager.get_session("missing") is None
+            queries_within_ttl = _FakeMongo.queries
+            # 模拟记录已超过有效期
+            manager._missing_sessions["missing"] -= manager.missing_cache_ttl
+            assert await manager.get_session("missing") is None
+        return queries_within_ttl
+
+    queries_within_ttl = asyncio.run(run())
+    assert queries_within_ttl == 1
+    assert _FakeMongo.queries == 2
+    assert "missing" in manager._missing_sessions
+
+
+def test_cleanup_removes_owner_entries_without_user_set():
+    """用户会话列表先于会话过期时，清理仍能移除会话所属用户哈希中的过期条目"""
+    redis = _fake_redis()
+    manager = SessionManager()
+
+    async def run():
+        await redis.hset("agent_session_owner", mapping={"alive": "u1", "expired": "u1"})
+        await redis.hset("agent_session_hash:alive", mapping={"session_id": "alive"})
+        with _patch_redis(redis):
+            await manager.cleanup_expired_sessions()
+        return await redis.hgetall("agent_session_owner")
+
+    assert asyncio.run(run()) == {"alive": "u1"}
+
+
+if __name__ == "__main__":
+    test_start_falls_back_to_cleanup_without_expired_events()
+    test_start_listens_for_expired_events_when_enabled()
+    test_get_session_migrates_legacy_string_session()
+    test_migrate_legacy_sessions()
+    test_local_cache_returns_independent_copies()
+    test_touch_flushes_immediately_without_background_task()
+    test_write_and_touch_scripts_round_trip()
+    test_missing_session_negative_cache_expires()
+    test_cleanup_removes_owner_entries_without_user_set()
+    print("✅ 测试完成")
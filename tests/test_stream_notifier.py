@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+测试流式通知器的消息队列、状态去重和时间戳缓存
+"""
+
+import asyncio
+from unittest.mock import patch
+
+from copilot.core import stream_notifier
+from copilot.core.stream_notifier import StreamNotifier
+
+
+def test_full_queue_drops_oldest_message():
+    """会话消息队列已满时丢弃最早的消息，保留最新的消息"""
+    session_id = "queue-full-session"
+    StreamNotifier.clear_pending_messages(session_id)
+
+    async def run():
+        with patch.object(stream_notifier, "_MAX_PENDING_MESSAGES", 3):
+            for i in range(5):
+                await StreamNotifier.add_stream_message(session_id, i)
+        return StreamNotifier.get_pending_messages(session_id)
+
+    try:
+        assert asyncio.run(run()) == [2, 3, 4]
+    finally:
+        StreamNotifier.clear_pending_messages(session_id)
+
+
+def test_duplicate_status_within_window_is_skipped():
+    """50ms内同一请求的相同无负载状态只发送一次；超出窗口、状态变化或带负载时照常发送"""
+    session_id = "status-dedup-session"
+    StreamNotifier.clear_pending_messages(session_id)
+
+    async def send(status, **kwargs):
+        await StreamNotifier.send_tool_execution_status(session_id, "req-1", "search", status, **kwargs)
+
+    async def run():
+        await send("executing")
+        await send("executing")
+        await send("executing", progress=50)
+        await send("completed")
+        await send("completed")
+        # 模拟上一次发送已超过去重窗口
+        request_id, status, sent_at = StreamNotifier._last_status[session_id]
+        StreamNotifier._last_status[session_id] = (request_id, status, sent_at - stream_notifier._STATUS_DEDUP_WINDOW)
+        await send("completed")
+        return [(message.data.status, message.data.progress) for message in StreamNotifier.get_pending_messages(session_id)]
+
+    try:
+        assert asyncio.run(run()) == [("executing", None), ("executing", 50), ("completed", None), ("completed", None)]
+    finally:
+        StreamNotifier.clear_pending_messages(session_id)
+
+
+def test_timestamp_refreshes_when_clock_steps_backwards():
+    """系统时钟回拨后时间戳立即跟随当前时间，不沿用回拨前缓存的时间"""
+    with patch.object(stream_notifier.time, "time", return_value=2_000_000_000.0):
+        before = stream_notifier._utc_now()
+    with patch.object(stream_notifier.time, "time", return_value=1_999_999_990.0):
+        after = stream_notifier._utc_now()
+    assert (before - after).total_seconds() == 10
+
+
+if __name__ == "__main__":
+    test_full_queue_drops_oldest_message()
+    test_duplicate_status_within_window_is_skipped()
+    test_timestamp_refreshes_when_clock_steps_backwards()
+    print("✅ 测试完成")
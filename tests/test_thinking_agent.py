@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+测试ThinkingAgent的思考缓存和计划序列化
+"""
+
+import asyncio
+from unittest.mock import patch
+
+from copilot.core import thinking_agent
+from copilot.core.thinking_agent import ThinkingAgent, ThinkingResult, ThinkingStep
+
+
+class _FakeResponse:
+    def __init__(self, content: str):
+        self.content = content
+        self.response_metadata = {}
+
+
+class _FakeLLM:
+    """按模板生成思考响应的假LLM，{u}替换为本次用户输入"""
+
+    def __init__(self, template: str):
+        self.template = template
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        user_input = messages[-1].content.split("用户输入：\n")[1].split("\n")[0]
+        return _FakeResponse(self.template.format(u=user_input))
+
+
+def _make_agent(template: str):
+    llm = _FakeLLM(template)
+    with patch.object(thinking_agent, "_get_shared_llm", return_value=llm):
+        agent = ThinkingAgent()
+    return agent, llm
+
+
+def test_think_cache_replaces_slots_at_token_boundary():
+    """槽位"100"不能改写LLM输出中的"1000"，命中缓存时只替换槽位本身"""
+    agent, llm = _make_agent("**用户意图分析**\n{u}\n**执行计划制定**\n1. 处理 100 条，共 1000 条\n")
+
+    async def run():
+        await agent.think("处理 100 条")
+        return await agent.think("处理 250 条")
+
+    result = asyncio.run(run())
+    assert llm.calls == 1
+    assert result.user_intent == "处理 250 条"
+    # 命中缓存计为成功请求
+    assert agent.stats["cache_hits"] == 1
+    assert agent.stats["total_requests"] == agent.stats["successful_requests"] + agent.stats["failed_requests"] == 2
+    assert result.execution_plan[0].description == "处理 250 条，共 1000 条"
+
+
+def test_think_cache_skips_rephrased_slot_values():
+    """LLM只输出了路径的文件名时不缓存，避免上一次请求的文件名出现在其他输入的结果中"""
+    agent, llm = _make_agent("**用户意图分析**\n{u}\n**执行计划制定**\n1. 读取 a.txt\n")
+
+    async def run():
+        await agent.think("读取文件 /data/a.txt")
+        return await agent.think("读取文件 /home/b.csv")
+
+    asyncio.run(run())
+    assert llm.calls == 2
+    assert agent.stats["cache_hits"] == 0
+
+
+def test_think_cache_skips_fallback_results():
+    """解析失败的回退结果不缓存"""
+    agent, llm = _make_agent("{u}")
+
+    async def run():
+        with patch.object(agent, "_parse_natural_thinking_response", side_effect=ValueError("bad")):
+            await agent.think("读取文件 /data/a.txt")
+            await agent.think("读取文件 /home/b.csv")
+
+    asyncio.run(run())
+    assert llm.calls == 2
+    assert not agent._think_cache
+
+
+def test_trivial_input_skips_llm_only_for_greetings():
+    """问候直接返回单步计划，ls等命令仍由LLM生成执行计划"""
+    agent, llm = _make_agent("**用户意图分析**\n{u}\n**执行计划制定**\n1. 使用list_files工具列出目录\n")
+
+    async def run():
+        return await agent.think("你好！"), await agent.think("ls")
+
+    greeting, command = asyncio.run(run())
+    assert llm.calls == 1
+    assert agent.stats["direct_responses"] == 1
+    assert greeting.execution_plan[0].expected_tools == []
+    assert command.user_intent == "ls"
+
+
+def test_sections_ignore_stray_bold_markers():
+    """正文中出现奇数个"**"时，后续章节仍能正确切分"""
+    agent, _ = _make_agent("{u}")
+    result = agent._parse_natural_thinking_response(
+        "**用户意图分析**\n用户想要计算 2**10\n**执行计划制定**\n1. 使用calculator工具计算2的10次方\n**复杂度评估**\n简单"
+    )
+    assert result.user_intent == "用户想要计算 2**10"
+    assert len(result.execution_plan) == 1
+    assert "calculator" in result.execution_plan[0].description
+    assert result.estimated_complexity == "low"
+
+
+def _sample_plan() -> ThinkingResult:
+    return ThinkingResult(
+        user_intent="检索文献",
+        problem_analysis="需要调用搜索工具",
+        execution_plan=[
+            ThinkingStep(step_id="step_1", description="搜索", reasoning="获取结果", expected_tools=["search"], parameters={"q": "x"}),
+            ThinkingStep(step_id="step_2", description="总结", reasoning="整理结果", dependencies=["step_1"]),
+        ],
+        estimated_complexity="low",
+    )
+
+
+def test_refine_prompt_uses_row_oriented_plan():
+    """计划优化prompt中的当前计划按步骤存储，与要求LLM返回的格式一致"""
+    agent, _ = _make_agent("{u}")
+    prompt = agent._build_refine_prompt(_sample_plan(), "少一步")[-1].content
+    assert '"step_id": "step_1"' in prompt
+    assert '"step_id": [' not in prompt
+
+
+if __name__ == "__main__":
+    test_think_cache_replaces_slots_at_token_boundary()
+    test_think_cache_skips_rephrased_slot_values()
+    test_think_cache_skips_fallback_results()
+    test_trivial_input_skips_llm_only_for_greetings()
+    test_sections_ignore_stray_bold_markers()
+    test_refine_prompt_uses_row_oriented_plan()
+    print("✅ 测试完成")
@@ -144,7 +144,7 @@ async def main():
     test_result = {"code": 0, "data": ["result1", "result2"]}
 
     # 清空消息队列
-    StreamNotifier._pending_messages[session_id] = []
+    StreamNotifier.clear_pending_messages(session_id)
 
     # 1. 发送权限请求
     request_id = await StreamNotifier.send_tool_permission_request(